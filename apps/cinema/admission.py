@@ -0,0 +1,265 @@
+"""
+Очередь на вход к бронированию популярных сеансов (виртуальный зал ожидания).
+
+Для каждого сеанса работает ведро токенов: оно пополняется со скоростью Movie.admission_rate
+посетителей в минуту и вмещает ADMISSION_BURST_SECONDS секунд этой скорости. Посетители
+встают в очередь и пропускаются строго по порядку, пока в ведре есть токены; пропущенный
+посетитель получает пропуск на ADMISSION_PASS_TTL секунд, который продлевается при каждом
+запросе. Остальные получают свою позицию в очереди и ожидаемое время ожидания.
+
+Страница ожидания обновляется чаще, чем раз в ADMISSION_QUEUE_TTL / 2 секунд. Посетители,
+которые не обновляли её дольше ADMISSION_QUEUE_TTL (закрыли вкладку), выбывают из очереди
+перед выдачей токенов и не расходуют их.
+
+Состояние лежит в Redis (или в памяти процесса, если Redis не настроен), поэтому очередь
+общая для всех веб-узлов. Посетитель определяется подписанной cookie.
+
+Пропускная способность сеанса (и название фильма для страницы ожидания) берётся из кэша
+Django: без очереди запрос бронирования не обращается к БД ради проверки. Изменения сеанса
+и фильма удаляют закэшированные значения (invalidate_sessions).
+"""
+
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import cache, wraps
+
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.db import transaction
+from django.http import JsonResponse
+from django.shortcuts import render
+from modeltranslation.utils import get_translation_fields
+
+from apps.core.redis_client import get_redis
+
+COOKIE_NAME = "admission_visitor"
+COOKIE_SALT = "cinema.admission"
+
+# KEYS: ведро (хэш tokens/ts/seq), очередь (zset по порядку прихода), пропуска (zset по сроку),
+#       последнее обращение посетителей из очереди (zset по времени)
+# ARGV: now_ms, посетитель, скорость (в минуту), ёмкость ведра, срок пропуска (мс),
+#       срок ожидания в очереди без обращений (мс)
+# Возвращает {1} если посетитель пропущен, иначе {0, позиция, остаток токенов}
+_ADMIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local rate = tonumber(ARGV[3]) / 60000
+local burst = tonumber(ARGV[4])
+local pass_ttl = tonumber(ARGV[5])
+local queue_ttl = tonumber(ARGV[6])
+
+redis.call("ZREMRANGEBYSCORE", KEYS[3], "-inf", now)
+if redis.call("ZSCORE", KEYS[3], ARGV[2]) then
+    redis.call("ZADD", KEYS[3], now + pass_ttl, ARGV[2])
+    redis.call("PEXPIRE", KEYS[3], pass_ttl)
+    return {1}
+end
+
+local state = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - ts, 0) * rate)
+
+if not redis.call("ZSCORE", KEYS[2], ARGV[2]) then
+    redis.call("ZADD", KEYS[2], redis.call("HINCRBY", KEYS[1], "seq", 1), ARGV[2])
+end
+redis.call("ZADD", KEYS[4], now, ARGV[2])
+
+local stale = redis.call("ZRANGEBYSCORE", KEYS[4], "-inf", "(" .. (now - queue_ttl))
+for _, visitor in ipairs(stale) do
+    redis.call("ZREM", KEYS[2], visitor)
+end
+redis.call("ZREMRANGEBYSCORE", KEYS[4], "-inf", "(" .. (now - queue_ttl))
+
+while tokens >= 1 do
+    local head = redis.call("ZRANGE", KEYS[2], 0, 0)[1]
+    if not head then
+        break
+    end
+    redis.call("ZREM", KEYS[2], head)
+    redis.call("ZREM", KEYS[4], head)
+    redis.call("ZADD", KEYS[3], now + pass_ttl, head)
+    tokens = tokens - 1
+end
+
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "ts", ARGV[1])
+for i = 1, 4 do
+    redis.call("PEXPIRE", KEYS[i], pass_ttl)
+end
+
+local rank = redis.call("ZRANK", KEYS[2], ARGV[2])
+if not rank then
+    return {1}
+end
+return {0, rank + 1, tostring(tokens)}
+"""
+
+
+def _keys(session_id):
+    prefix = f"admission:{session_id}"
+    return [prefix, f"{prefix}:queue", f"{prefix}:passes", f"{prefix}:seen"]
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+class RedisAdmissionStore:
+    def __init__(self, client):
+        self._admit = client.register_script(_ADMIT_SCRIPT)
+
+    def admit(self, session_id, visitor, rate, burst, pass_ttl_ms, queue_ttl_ms):
+        """Возвращает (пропущен, позиция в очереди, остаток токенов)"""
+        result = self._admit(keys=_keys(session_id), args=[_now_ms(), visitor, rate, burst, pass_ttl_ms, queue_ttl_ms])
+        if result[0]:
+            return True, 0, 0.0
+        return False, int(result[1]), float(result[2])
+
+
+class LocalAdmissionStore:
+    """Замена Redis в памяти процесса с той же семантикой (тесты и локальная разработка)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def admit(self, session_id, visitor, rate, burst, pass_ttl_ms, queue_ttl_ms):
+        now = _now_ms()
+        with self._lock:
+            state = self._sessions.setdefault(
+                session_id, {"tokens": burst, "ts": now, "queue": OrderedDict(), "passes": {}}
+            )
+            passes, queue = state["passes"], state["queue"]
+
+            for expired in [key for key, expires in passes.items() if expires <= now]:
+                del passes[expired]
+            if visitor in passes:
+                passes[visitor] = now + pass_ttl_ms
+                return True, 0, 0.0
+
+            tokens = min(burst, state["tokens"] + max(now - state["ts"], 0) * rate / 60000)
+            # Очередь хранит время последнего обращения, порядок — по приходу
+            queue[visitor] = now
+            for stale in [key for key, seen in queue.items() if seen < now - queue_ttl_ms]:
+                del queue[stale]
+            while tokens >= 1 and queue:
+                head, _ = queue.popitem(last=False)
+                passes[head] = now + pass_ttl_ms
+                tokens -= 1
+            state["tokens"], state["ts"] = tokens, now
+
+            if visitor in passes:
+                return True, 0, 0.0
+            return False, list(queue).index(visitor) + 1, tokens
+
+
+_local_store = LocalAdmissionStore()
+
+
+@cache
+def get_store():
+    client = get_redis()
+    return RedisAdmissionStore(client) if client else _local_store
+
+
+def admit(session_id, visitor, rate):
+    """
+    Пропускает посетителя к бронированию сеанса или ставит в очередь.
+
+    rate — посетителей в минуту. Возвращает (пропущен, позиция, ожидание в секундах).
+    """
+    burst = max(1, math.ceil(rate * settings.ADMISSION_BURST_SECONDS / 60))
+    admitted, position, tokens = get_store().admit(
+        session_id, visitor, rate, burst, settings.ADMISSION_PASS_TTL * 1000, settings.ADMISSION_QUEUE_TTL * 1000
+    )
+    if admitted:
+        return True, 0, 0
+    return False, position, math.ceil((position - tokens) * 60 / rate)
+
+
+def _gate_key(session_id):
+    return f"admission:gate:{session_id}"
+
+
+def session_gate(session_id):
+    """
+    Поля фильма сеанса, нужные очереди: пропускная способность и названия на всех языках.
+
+    Читаются из кэша, при промахе — одним запросом. None, если сеанса нет.
+    """
+    key = _gate_key(session_id)
+    gate = django_cache.get(key)
+    if gate is None:
+        from .models import Session
+
+        fields = ["admission_rate", *get_translation_fields("name")]
+        row = Session.objects.filter(pk=session_id).values_list(*(f"movie__{field}" for field in fields)).first()
+        if row is None:
+            return None
+        gate = dict(zip(fields, row, strict=True))
+        django_cache.set(key, gate, settings.ADMISSION_GATE_TTL)
+    return gate
+
+
+def invalidate_sessions(session_ids):
+    """Удаляет закэшированные поля очереди сеансов после коммита"""
+    keys = [_gate_key(pk) for pk in set(session_ids)]
+    if keys:
+        transaction.on_commit(lambda: django_cache.delete_many(keys))
+
+
+def admission_control(session_kwarg):
+    """
+    Декоратор представлений бронирования: при заданной у фильма пропускной способности
+    посетители проходят через очередь сеанса.
+
+    GET-запросы в очереди получают страницу ожидания, остальные (AJAX) — 429 с позицией
+    и временем ожидания в JSON. session_kwarg — имя аргумента URL с id сеанса.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            from .models import Movie
+
+            session_id = kwargs[session_kwarg]
+            gate = session_gate(session_id)
+            if gate is None or not gate["admission_rate"]:
+                return view(request, *args, **kwargs)
+
+            visitor = request.get_signed_cookie(COOKIE_NAME, default=None, salt=COOKIE_SALT)
+            new_visitor = visitor is None
+            if new_visitor:
+                visitor = uuid.uuid4().hex
+
+            admitted, position, eta = admit(session_id, visitor, gate["admission_rate"])
+            # Повторять запрос надо чаще, чем истекает место в очереди
+            retry = min(max(eta, 3), settings.ADMISSION_QUEUE_TTL // 2)
+            if admitted:
+                response = view(request, *args, **kwargs)
+            elif request.method == "GET":
+                response = render(
+                    request,
+                    "cinema/waiting_room.html",
+                    # Несохранённый фильм: modeltranslation выберет название на языке запроса
+                    {"movie": Movie(**gate), "position": position, "eta": eta, "refresh": retry},
+                )
+            else:
+                response = JsonResponse(
+                    {"error": "Слишком много покупателей, вы в очереди", "position": position, "eta": eta},
+                    status=429,
+                )
+
+            if not admitted:
+                response["Retry-After"] = str(retry)
+            if new_visitor:
+                response.set_signed_cookie(
+                    COOKIE_NAME, visitor, salt=COOKIE_SALT, max_age=24 * 60 * 60, httponly=True, samesite="Lax"
+                )
+            return response
+
+        return wrapper
+
+    return decorator
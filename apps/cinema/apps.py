@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class CinemaConfig(AppConfig):
+    name = "apps.cinema"
+
+    def ready(self):
+        from . import signals  # noqa: F401
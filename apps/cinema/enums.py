@@ -6,3 +6,9 @@ class MovieFormat(models.TextChoices):
     TWO_D = "2D", _("2D")
     THREE_D = "3D", _("3D")
     IMAX = "IMAX", _("IMAX")
+
+
+class SeatState(models.TextChoices):
+    FREE = "free", _("Свободно")
+    HELD = "held", _("Забронировано")
+    SOLD = "sold", _("Продано")
@@ -0,0 +1,158 @@
+"""
+Публикация изменений мест сеанса для live-обновления схемы зала (server-sent events).
+
+События идут через Redis pub/sub в канал seats:<session_id>, поэтому подписчик на одном
+веб-узле получает изменения, сделанные на любом другом. Процесс держит одно соединение
+с Redis (RedisFanout, подписка на seats:*) и раздаёт сообщения открытым потокам своих
+сеансов; соединений с Redis не становится больше с числом открытых вкладок. Без REDIS_URL
+используется брокер в памяти процесса.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import weakref
+
+import redis.asyncio
+from django.conf import settings
+
+from apps.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед повторной подпиской после потери соединения с Redis (секунды)
+RECONNECT_DELAY = 1
+
+
+def _channel(session_id):
+    return f"seats:{session_id}"
+
+
+class LocalBroker:
+    """Замена Redis pub/sub в памяти процесса: публикация из потоков, подписка из asyncio"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, session_id, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(session_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+
+    def subscribe(self, session_id):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(session_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, session_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(session_id, set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._subscribers.pop(session_id, None)
+
+
+_local_broker = LocalBroker()
+
+
+class RedisFanout:
+    """
+    Единственный подписчик Redis в event loop процесса: слушает все каналы seats:* и
+    передаёт сообщения в очереди потоков через LocalBroker.
+    """
+
+    def __init__(self):
+        self.broker = LocalBroker()
+        self._subscribed = asyncio.Event()
+        self._task = None
+
+    async def ready(self):
+        """Запускает подписку, если она ещё не работает, и ждёт её оформления"""
+        if self._task is None or self._task.done():
+            self._subscribed.clear()
+            self._task = asyncio.create_task(self._run())
+        await self._subscribed.wait()
+
+    async def _run(self):
+        client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+        pubsub = client.pubsub()
+        try:
+            while True:
+                try:
+                    await pubsub.psubscribe(_channel("*"))
+                    self._subscribed.set()
+                    while True:
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+                        if message:
+                            session_id = int(message["channel"].decode().removeprefix(_channel("")))
+                            self.broker.publish(session_id, message["data"].decode())
+                except redis.ConnectionError:
+                    # Потоки остаются открытыми; изменения, пропущенные за время обрыва, клиент
+                    # получит снимком при переподключении EventSource
+                    logger.warning("Подписка на изменения мест потеряла соединение с Redis", exc_info=True)
+                    await asyncio.sleep(RECONNECT_DELAY)
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_fanouts = weakref.WeakKeyDictionary()
+
+
+def _redis_fanout():
+    loop = asyncio.get_running_loop()
+    if loop not in _fanouts:
+        _fanouts[loop] = RedisFanout()
+    return _fanouts[loop]
+
+
+def publish(session_id, seats, occupied, user_id=None):
+    """
+    Сообщает подписчикам сеанса, что места (пары (ряд, место)) заняты или освободились.
+
+    user_id — владелец удержания, чтобы его собственная страница не помечала места занятыми.
+    """
+    message = json.dumps(
+        {
+            "seats": [f"{row}-{number}" for row, number in sorted(seats)],
+            "occupied": occupied,
+            "user_id": user_id,
+        }
+    )
+    client = get_redis()
+    if client:
+        client.publish(_channel(session_id), message)
+    else:
+        _local_broker.publish(session_id, message)
+
+
+async def listen(session_id, heartbeat):
+    """
+    Асинхронный поток сообщений сеанса (JSON-строки).
+
+    Первым отдаёт None, как только подписка оформлена, а затем None каждые heartbeat
+    секунд тишины — по ним поток отправляет keep-alive. Закрывать через contextlib.aclosing.
+    """
+    if settings.REDIS_URL:
+        fanout = _redis_fanout()
+        broker = fanout.broker
+    else:
+        fanout = None
+        broker = _local_broker
+
+    subscriber = broker.subscribe(session_id)
+    try:
+        if fanout:
+            await fanout.ready()
+        yield None
+        while True:
+            try:
+                yield await asyncio.wait_for(subscriber[1].get(), heartbeat)
+            except TimeoutError:
+                yield None
+    finally:
+        broker.unsubscribe(session_id, subscriber)
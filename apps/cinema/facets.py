@@ -0,0 +1,117 @@
+"""
+Варианты фильтров расписания с числом подходящих сеансов (фасеты).
+
+Один агрегирующий запрос группирует строки расписания начиная с сегодняшнего дня по
+(формат, кинотеатр, фильм, зал, дата) и считает в каждой группе все сеансы и ещё не
+начавшиеся. Счётчик варианта каждого фильтра считается в памяти с учётом остальных
+выбранных фильтров, то есть показывает, сколько сеансов останется после его выбора.
+
+Результат кэшируется на комбинацию фильтров и язык. Изменения расписания увеличивают
+поколение кэша (invalidate), и все сохранённые фасеты устаревают сразу.
+"""
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+from modeltranslation.utils import get_language
+
+from .enums import MovieFormat
+from .models import ScheduleEntry
+from .schedule import parse_filters
+
+GENERATION_KEY = "schedule:facets:generation"
+
+
+def invalidate():
+    """Сбрасывает фасеты всех комбинаций фильтров"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, timeout=None)
+
+
+def _cache_key(filters, language):
+    generation = cache.get_or_set(GENERATION_KEY, 1, timeout=None)
+    payload = json.dumps(
+        [sorted(filters[name]) for name in ("format", "cinema", "movie", "hall")]
+        + [filters["date"] and filters["date"].isoformat(), language]
+    )
+    return f"schedule:facets:{generation}:{hashlib.md5(payload.encode()).hexdigest()}"
+
+
+def _name(row, field, language):
+    # Без перевода на текущий язык — название на языке по умолчанию, как у modeltranslation
+    return row[f"{field}_{language}"] or row[f"{field}_{settings.MODELTRANSLATION_DEFAULT_LANGUAGE}"]
+
+
+def _groups(language):
+    """Группы строк расписания начиная с сегодняшнего дня: всего сеансов и ещё не начавшихся"""
+    languages = {language, settings.MODELTRANSLATION_DEFAULT_LANGUAGE}
+    names = [f"{field}_{lang}" for field in ("movie_name", "cinema_name", "hall_name") for lang in languages]
+    return (
+        ScheduleEntry.objects.filter(date__gte=timezone.localdate())
+        .values("format", "cinema_id", "movie_id", "hall_id", "date", *names)
+        .annotate(total=Count("pk"), upcoming=Count("pk", filter=Q(start_time__gte=timezone.now())))
+        .order_by()
+    )
+
+
+def _matches(row, filters, skip):
+    for name, field in (("format", "format"), ("cinema", "cinema_id"), ("movie", "movie_id"), ("hall", "hall_id")):
+        if name != skip and filters[name] and row[field] not in filters[name]:
+            return False
+    return skip == "date" or not filters["date"] or row["date"] == filters["date"]
+
+
+def compute_facets(filters, language):
+    formats, cinemas, movies, halls, dates = {}, {}, {}, {}, {}
+    for row in _groups(language):
+        # Без выбранной даты расписание показывает только предстоящие сеансы
+        count = row["total"] if filters["date"] else row["upcoming"]
+        if _matches(row, filters, "format"):
+            formats[row["format"]] = formats.get(row["format"], 0) + count
+        if _matches(row, filters, "cinema"):
+            cinema = cinemas.setdefault(row["cinema_id"], {"id": row["cinema_id"], "count": 0})
+            cinema["name"] = _name(row, "cinema_name", language)
+            cinema["count"] += count
+        if _matches(row, filters, "movie"):
+            movie = movies.setdefault(row["movie_id"], {"id": row["movie_id"], "count": 0})
+            movie["name"] = _name(row, "movie_name", language)
+            movie["count"] += count
+        if _matches(row, filters, "hall"):
+            hall = halls.setdefault(row["hall_id"], {"id": row["hall_id"], "count": 0})
+            hall["name"] = _name(row, "hall_name", language)
+            hall["cinema_name"] = _name(row, "cinema_name", language)
+            hall["count"] += count
+        if _matches(row, filters, "date"):
+            dates[row["date"]] = dates.get(row["date"], 0) + row["total"]
+
+    def options(values, selected, key):
+        # Варианты без сеансов скрываются, кроме уже выбранных
+        return sorted((option for option in values.values() if option["count"] or option["id"] in selected), key=key)
+
+    return {
+        "formats": [
+            {"value": value, "label": label, "count": formats.get(value, 0)} for value, label in MovieFormat.choices
+        ],
+        "cinemas": options(cinemas, filters["cinema"], lambda option: option["name"]),
+        "movies": options(movies, filters["movie"], lambda option: option["name"]),
+        "halls": options(halls, filters["hall"], lambda option: (option["cinema_name"], option["name"])),
+        "dates": [{"date": day, "count": count} for day, count in sorted(dates.items()) if count],
+    }
+
+
+def get_facets(params):
+    """Фасеты для GET-параметров страницы расписания (из кэша, если есть)"""
+    filters = parse_filters(params)
+    language = get_language()
+    key = _cache_key(filters, language)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(filters, language)
+        cache.set(key, facets, settings.SCHEDULE_FACETS_TTL)
+    return facets
@@ -0,0 +1,145 @@
+"""
+Ленты предстоящих сеансов кинотеатра или фильма для партнёров: iCalendar и JSON Lines.
+
+Строки расписания (ScheduleEntry) читаются курсором на сервере (iterator) и отдаются
+по мере чтения через StreamingHttpResponse, поэтому память не зависит от размера ленты.
+Счётчики мест в ленты не входят: они меняются с каждой бронью и сделали бы ленту
+некэшируемой.
+
+Состояние ленты — число её строк и последнее изменение среди них (updated_at строк
+расписания обновляется при изменении сеанса, фильма, зала или кинотеатра). Из него
+строятся ETag и Last-Modified, так что повторный запрос без изменений стоит одного
+агрегирующего запроса и получает 304.
+"""
+
+import hashlib
+import json
+from datetime import UTC
+
+from django.db.models import Count, Max
+from django.urls import reverse
+from django.utils import timezone, translation
+from modeltranslation.utils import get_language
+
+from .models import ScheduleEntry
+
+CHUNK_SIZE = 500
+# RFC 5545: строки длиннее 75 октетов переносятся
+ICAL_LINE_OCTETS = 75
+
+CONTENT_TYPES = {
+    "ics": "text/calendar; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+
+def feed_entries(kind, pk):
+    """Предстоящие сеансы кинотеатра (kind="cinema") или фильма (kind="movie")"""
+    return ScheduleEntry.objects.filter(**{f"{kind}_id": pk}, start_time__gte=timezone.now())
+
+
+def feed_state(entries, fmt):
+    """(ETag, время последнего изменения) ленты одним агрегирующим запросом"""
+    state = entries.aggregate(count=Count("pk"), last_modified=Max("updated_at"))
+    last_modified = state["last_modified"]
+    payload = f"{fmt}:{get_language()}:{state['count']}:{last_modified and last_modified.isoformat()}"
+    return f'"{hashlib.md5(payload.encode()).hexdigest()}"', last_modified
+
+
+def stream(chunks):
+    """
+    Отдаёт генератор ленты под языком запроса: ленту читают уже после выхода из view,
+    а от языка зависят названия и ссылки
+    """
+    language = translation.get_language()
+
+    def generate():
+        with translation.override(language):
+            yield from chunks
+
+    return generate()
+
+
+def _rows(entries):
+    return entries.order_by("start_time", "session").iterator(chunk_size=CHUNK_SIZE)
+
+
+def _ical_text(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _ical_time(value):
+    return value.astimezone(UTC).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _fold(line):
+    """Переносит строку iCalendar по 75 октетов, не разрывая символы UTF-8"""
+    parts = []
+    current, size = [], 0
+    for char in line:
+        octets = len(char.encode())
+        # Продолжение начинается с пробела, он занимает один октет
+        limit = ICAL_LINE_OCTETS - (1 if parts else 0)
+        if size + octets > limit:
+            parts.append("".join(current))
+            current, size = [], 0
+        current.append(char)
+        size += octets
+    parts.append("".join(current))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def ical_feed(entries, title, base_url, host):
+    """Генератор ленты iCalendar: заголовок календаря и по одному VEVENT на сеанс"""
+    yield "".join(
+        _fold(line)
+        for line in (
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            "PRODID:-//KinoCMS//Schedule//RU",
+            "CALSCALE:GREGORIAN",
+            "METHOD:PUBLISH",
+            f"X-WR-CALNAME:{_ical_text(title)}",
+        )
+    )
+    for entry in _rows(entries):
+        lines = (
+            "BEGIN:VEVENT",
+            f"UID:session-{entry.session_id}@{host}",
+            f"DTSTAMP:{_ical_time(entry.updated_at)}",
+            f"DTSTART:{_ical_time(entry.start_time)}",
+            f"DTEND:{_ical_time(entry.end_time)}",
+            f"SUMMARY:{_ical_text(f'{entry.movie_name} ({entry.get_format_display()})')}",
+            f"LOCATION:{_ical_text(f'{entry.cinema_name}, {entry.hall_name}')}",
+            f"DESCRIPTION:{_ical_text(f'{entry.price} грн')}",
+            f"URL:{base_url}{reverse('cinema:booking', args=[entry.session_id])}",
+            "END:VEVENT",
+        )
+        yield "".join(_fold(line) for line in lines)
+    yield _fold("END:VCALENDAR")
+
+
+def jsonl_feed(entries, base_url):
+    """Генератор ленты JSON Lines: по объекту сеанса на строку"""
+    for entry in _rows(entries):
+        row = {
+            "id": entry.session_id,
+            "start_time": timezone.localtime(entry.start_time).isoformat(),
+            "end_time": timezone.localtime(entry.end_time).isoformat(),
+            "date": entry.date.isoformat(),
+            "format": entry.format,
+            "price": str(entry.price),
+            "movie": {"id": entry.movie_id, "name": entry.movie_name},
+            "cinema": {"id": entry.cinema_id, "name": entry.cinema_name},
+            "hall": {"id": entry.hall_id, "name": entry.hall_name},
+            "url": f"{base_url}{reverse('cinema:booking', args=[entry.session_id])}",
+            "updated_at": entry.updated_at.isoformat(),
+        }
+        yield json.dumps(row, ensure_ascii=False) + "\n"
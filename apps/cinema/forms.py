@@ -4,6 +4,7 @@ from apps.core.forms import FORM_CSS_CLASSES, LABELS, PLACEHOLDERS
 
 from .enums import MovieFormat
 from .models import Cinema, Hall, Movie
+from .services import sync_hall_seats
 
 DATE_INPUT_FORMAT = "%Y-%m-%d"
 
@@ -49,6 +50,13 @@ class PageMovieForm(forms.ModelForm):
                     "style": "max-width: 200px;",
                 },
             ),
+            "admission_rate": forms.NumberInput(
+                attrs={
+                    "class": FORM_CSS_CLASSES["TEXT_INPUT"],
+                    "min": 0,
+                    "style": "max-width: 200px;",
+                }
+            ),
         }
 
         labels = {
@@ -232,5 +240,6 @@ class HallForm(forms.ModelForm):
         if commit:
             instance.save()
             self.save_m2m()
+            sync_hall_seats(instance)
 
         return instance
@@ -0,0 +1,246 @@
+"""
+Временное удержание мест на время выбора.
+
+Удержание атомарно резервирует набор мест сеанса в Redis (или в памяти процесса, если Redis
+не настроен) на SEAT_HOLD_TTL секунд. Неоплаченные удержания истекают сами, без записей в БД;
+Postgres затрагивается только при подтверждении брони или покупки в process_booking.
+
+Места сеанса лежат в хэше holds:<session_id> в виде "ряд-место" -> "hold_id|user_id|expires_ms",
+сами удержания — в ключах hold:<hold_id> с TTL. Места одного пользователя не конфликтуют друг
+с другом, поэтому после перезагрузки страницы покупатель может снова выбрать свои места.
+"""
+
+import json
+import threading
+import time
+import uuid
+from functools import cache
+
+from django.conf import settings
+
+from apps.core.redis_client import get_redis
+
+# KEYS: хэш мест сеанса, ключ удержания
+# ARGV: now_ms, ttl_ms, hold_id, user_id, данные удержания (JSON), места...
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local conflicts = {}
+for i = 6, #ARGV do
+    local current = redis.call("HGET", KEYS[1], ARGV[i])
+    if current then
+        local hold_id, user_id, expires = string.match(current, "^(.-)|(.-)|(%d+)$")
+        if user_id ~= ARGV[4] and tonumber(expires) > now then
+            table.insert(conflicts, ARGV[i])
+        end
+    end
+end
+if #conflicts > 0 then
+    return conflicts
+end
+
+local previous = redis.call("GET", KEYS[2])
+if previous then
+    for _, seat in ipairs(cjson.decode(previous)["seats"]) do
+        local current = redis.call("HGET", KEYS[1], seat)
+        if current and string.sub(current, 1, #ARGV[3] + 1) == ARGV[3] .. "|" then
+            redis.call("HDEL", KEYS[1], seat)
+        end
+    end
+end
+
+local value = ARGV[3] .. "|" .. ARGV[4] .. "|" .. (now + tonumber(ARGV[2]))
+for i = 6, #ARGV do
+    redis.call("HSET", KEYS[1], ARGV[i], value)
+end
+redis.call("SET", KEYS[2], ARGV[5], "PX", ARGV[2])
+if redis.call("PTTL", KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return conflicts
+"""
+
+# KEYS: хэш мест сеанса, ключ удержания; ARGV: hold_id
+_RELEASE_SCRIPT = """
+local previous = redis.call("GET", KEYS[2])
+if not previous then
+    return 0
+end
+for _, seat in ipairs(cjson.decode(previous)["seats"]) do
+    local current = redis.call("HGET", KEYS[1], seat)
+    if current and string.sub(current, 1, #ARGV[1] + 1) == ARGV[1] .. "|" then
+        redis.call("HDEL", KEYS[1], seat)
+    end
+end
+redis.call("DEL", KEYS[2])
+return 1
+"""
+
+
+class SeatsHeldError(Exception):
+    """Часть мест удерживает другой покупатель"""
+
+    def __init__(self, seats):
+        super().__init__(seats)
+        self.seats = seats
+
+
+def _seat_key(row, number):
+    return f"{row}-{number}"
+
+
+def _parse_seat_key(key):
+    row, number = key.split("-")
+    return int(row), int(number)
+
+
+def _session_key(session_id):
+    return f"holds:{session_id}"
+
+
+def _hold_key(hold_id):
+    return f"hold:{hold_id}"
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+class RedisHoldStore:
+    def __init__(self, client):
+        self.client = client
+        self._acquire = client.register_script(_ACQUIRE_SCRIPT)
+        self._release = client.register_script(_RELEASE_SCRIPT)
+
+    def acquire(self, hold, ttl_ms):
+        keys = [_session_key(hold["session_id"]), _hold_key(hold["id"])]
+        args = [_now_ms(), ttl_ms, hold["id"], hold["user_id"], json.dumps(hold), *hold["seats"]]
+        return [seat.decode() for seat in self._acquire(keys=keys, args=args)]
+
+    def get(self, hold_id):
+        payload = self.client.get(_hold_key(hold_id))
+        return json.loads(payload) if payload else None
+
+    def release(self, hold_id):
+        hold = self.get(hold_id)
+        if hold:
+            self._release(keys=[_session_key(hold["session_id"]), _hold_key(hold_id)], args=[hold_id])
+
+    def held(self, session_id):
+        """Неистёкшие удержания сеанса: {"ряд-место": user_id}"""
+        now = _now_ms()
+        result = {}
+        for seat, value in self.client.hgetall(_session_key(session_id)).items():
+            _, user_id, expires = value.decode().split("|")
+            if int(expires) > now:
+                result[seat.decode()] = int(user_id)
+        return result
+
+
+class LocalHoldStore:
+    """Замена Redis в памяти процесса с той же семантикой (тесты и локальная разработка)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seats = {}
+        self._holds = {}
+
+    def _live_hold(self, hold_id):
+        entry = self._holds.get(hold_id)
+        if entry and entry[1] <= _now_ms():
+            del self._holds[hold_id]
+            return None
+        return entry
+
+    def _drop_seats(self, hold):
+        seats = self._seats.get(hold["session_id"], {})
+        for seat in hold["seats"]:
+            if seats.get(seat, (None,))[0] == hold["id"]:
+                del seats[seat]
+
+    def acquire(self, hold, ttl_ms):
+        now = _now_ms()
+        with self._lock:
+            seats = self._seats.setdefault(hold["session_id"], {})
+            conflicts = [
+                seat
+                for seat in hold["seats"]
+                if seat in seats and seats[seat][1] != hold["user_id"] and seats[seat][2] > now
+            ]
+            if conflicts:
+                return conflicts
+
+            previous = self._live_hold(hold["id"])
+            if previous:
+                self._drop_seats(previous[0])
+            for seat in hold["seats"]:
+                seats[seat] = (hold["id"], hold["user_id"], now + ttl_ms)
+            self._holds[hold["id"]] = (hold, now + ttl_ms)
+            return []
+
+    def get(self, hold_id):
+        with self._lock:
+            entry = self._live_hold(hold_id)
+            return entry[0] if entry else None
+
+    def release(self, hold_id):
+        with self._lock:
+            entry = self._holds.pop(hold_id, None)
+            if entry:
+                self._drop_seats(entry[0])
+
+    def held(self, session_id):
+        now = _now_ms()
+        with self._lock:
+            return {
+                seat: user_id
+                for seat, (_, user_id, expires) in self._seats.get(session_id, {}).items()
+                if expires > now
+            }
+
+
+_local_store = LocalHoldStore()
+
+
+@cache
+def get_store():
+    client = get_redis()
+    return RedisHoldStore(client) if client else _local_store
+
+
+def acquire(session_id, seats, user_id, hold_id=None):
+    """
+    Удерживает места (пары (ряд, место)) за пользователем на SEAT_HOLD_TTL секунд.
+
+    Повторный вызов с тем же hold_id заменяет набор мест удержания и продлевает его.
+    Возвращает данные удержания; при конфликте бросает SeatsHeldError со списком мест.
+    """
+    hold = {
+        "id": hold_id or uuid.uuid4().hex,
+        "session_id": session_id,
+        "user_id": user_id,
+        "seats": sorted({_seat_key(row, number) for row, number in seats}),
+    }
+    conflicts = get_store().acquire(hold, settings.SEAT_HOLD_TTL * 1000)
+    if conflicts:
+        raise SeatsHeldError(conflicts)
+    return hold
+
+
+def get_hold(hold_id):
+    return get_store().get(hold_id) if hold_id else None
+
+
+def hold_seats(hold):
+    """Места удержания как пары (ряд, место)"""
+    return {_parse_seat_key(seat) for seat in hold["seats"]}
+
+
+def release(hold_id):
+    get_store().release(hold_id)
+
+
+def held_seats(session_id, exclude_user_id=None):
+    """Места сеанса, удерживаемые другими пользователями, как пары (ряд, место)"""
+    return {
+        _parse_seat_key(seat) for seat, user_id in get_store().held(session_id).items() if user_id != exclude_user_id
+    }
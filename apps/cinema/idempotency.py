@@ -0,0 +1,143 @@
+"""
+Ключи идемпотентности для API бронирования.
+
+Клиент передаёт заголовок Idempotency-Key; первый запрос с ключом выполняется и его ответ
+сохраняется на IDEMPOTENCY_KEY_TTL секунд, повторы получают сохранённый ответ без обращения
+к таблицам мест. Пока первый запрос выполняется, ключ занят маркером с коротким TTL
+(IDEMPOTENCY_LOCK_TTL), и параллельный повтор получает 409.
+
+Ключи хранятся в Redis (или в памяти процесса, если Redis не настроен) отдельно для каждого
+пользователя. Ответ сохраняется вместе с отпечатком запроса: тот же ключ с другим телом
+запроса отклоняется.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from functools import cache, partial, wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
+
+from apps.core.redis_client import get_redis
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+_PENDING = "pending"
+
+
+def _key(user_id, idempotency_key):
+    return f"idempotency:{user_id}:{idempotency_key}"
+
+
+class RedisResultStore:
+    def __init__(self, client):
+        self.client = client
+
+    def begin(self, key, ttl):
+        """Занимает ключ; если он уже есть — возвращает сохранённое значение"""
+        if self.client.set(key, _PENDING, nx=True, ex=ttl):
+            return None
+        value = self.client.get(key)
+        return value.decode() if value else _PENDING
+
+    def finish(self, key, value, ttl):
+        self.client.set(key, value, ex=ttl)
+
+    def release(self, key):
+        self.client.delete(key)
+
+
+class LocalResultStore:
+    """Замена Redis в памяти процесса с той же семантикой (тесты и локальная разработка)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def begin(self, key, ttl):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._values.get(key)
+            if entry and entry[1] > now:
+                return entry[0]
+            self._values[key] = (_PENDING, now + ttl)
+            return None
+
+    def finish(self, key, value, ttl):
+        with self._lock:
+            self._values[key] = (value, time.monotonic() + ttl)
+
+    def release(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+
+_local_store = LocalResultStore()
+
+
+@cache
+def get_store():
+    client = get_redis()
+    return RedisResultStore(client) if client else _local_store
+
+
+def _fingerprint(request):
+    return hashlib.sha256(request.path.encode() + b"\n" + request.body).hexdigest()
+
+
+def _store_response(key, fingerprint, response):
+    value = json.dumps({"fingerprint": fingerprint, "status": response.status_code, "body": response.content.decode()})
+    get_store().finish(key, value, settings.IDEMPOTENCY_KEY_TTL)
+
+
+def idempotent(view):
+    """
+    Декоратор POST-представления с JSON-ответом: повтор с тем же Idempotency-Key
+    возвращает сохранённый ответ. Без заголовка или без авторизации представление
+    вызывается как обычно.
+
+    Ответ сохраняется после коммита транзакции запроса, ответы 5xx не сохраняются,
+    чтобы клиент мог повторить запрос.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        idempotency_key = request.headers.get(HEADER)
+        if not idempotency_key or request.method != "POST" or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            return JsonResponse({"error": "Слишком длинный ключ идемпотентности"}, status=400)
+
+        store = get_store()
+        key = _key(request.user.pk, idempotency_key)
+        fingerprint = _fingerprint(request)
+
+        stored = store.begin(key, settings.IDEMPOTENCY_LOCK_TTL)
+        if stored == _PENDING:
+            return JsonResponse({"error": "Запрос с этим ключом ещё обрабатывается"}, status=409)
+        if stored is not None:
+            stored = json.loads(stored)
+            if stored["fingerprint"] != fingerprint:
+                return JsonResponse({"error": "Ключ идемпотентности уже использован для другого запроса"}, status=422)
+            response = HttpResponse(stored["body"], status=stored["status"], content_type="application/json")
+            response["Idempotent-Replayed"] = "true"
+            return response
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            store.release(key)
+            raise
+
+        if response.status_code >= 500:
+            store.release(key)
+        else:
+            transaction.on_commit(partial(_store_response, key, fingerprint, response))
+        return response
+
+    return wrapper
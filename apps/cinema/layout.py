@@ -0,0 +1,44 @@
+"""
+Скомпилированная схема зала для страниц бронирования, карты занятости и расчёта цен.
+
+Схема компилируется при сохранении зала (Hall.layout) и версионируется (Hall.layout_version).
+Разобранная схема и её готовый JSON кэшируются в процессе по паре (зал, версия): версия
+меняется при каждом изменении схемы, поэтому кэш не нужно сбрасывать, а запрос страницы
+не сериализует и не разбирает схему.
+"""
+
+import json
+import threading
+
+_MAX_CACHED = 512
+
+_lock = threading.Lock()
+_layouts = {}
+
+
+class HallLayout:
+    def __init__(self, data):
+        self.data = data
+        self.json = json.dumps(data, separators=(",", ":"))
+        self.capacity = data.get("capacity", 0)
+        # Места как пары (ряд, место) в порядке битов карты занятости
+        self.positions = [(row["label"], number) for row in data.get("rows", []) for number in row["cells"] if number]
+        self.index = {position: i for i, position in enumerate(self.positions)}
+
+
+def get_layout(hall):
+    """
+    Скомпилированная схема зала из кэша процесса.
+
+    Поле Hall.layout читается только при промахе, поэтому запросы, которым нужна лишь схема,
+    могут загружать зал с .defer("layout").
+    """
+    key = (hall.pk, hall.layout_version)
+    layout = _layouts.get(key)
+    if layout is None:
+        layout = HallLayout(hall.layout)
+        with _lock:
+            if len(_layouts) >= _MAX_CACHED:
+                _layouts.clear()
+            _layouts[key] = layout
+    return layout
@@ -0,0 +1,238 @@
+import json
+import logging
+import queue
+import random
+import statistics
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.cinema import seatmap
+from apps.cinema.models import Booking, Cinema, Hall, Movie, Session, SessionSeat
+from apps.cinema.services import sync_hall_seats
+
+CONFLICT_ERROR = "Некоторые из выбранных мест уже забронированы"
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест process_booking: параллельные брони пересекающихся и непересекающихся мест. "
+        "Запускайте на локальной копии Postgres (docker compose), тестовые данные удаляются после прогона"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000, help="Всего запросов (по умолчанию 2000)")
+        parser.add_argument("--concurrency", type=int, default=32, help="Параллельных потоков (по умолчанию 32)")
+        parser.add_argument("--users", type=int, default=200, help="Покупателей (по умолчанию 200)")
+        parser.add_argument("--rows", type=int, default=30, help="Рядов в зале (по умолчанию 30)")
+        parser.add_argument("--columns", type=int, default=40, help="Мест в ряду (по умолчанию 40)")
+        parser.add_argument("--max-seats", type=int, default=4, help="Мест в одном заказе, до (по умолчанию 4)")
+        parser.add_argument(
+            "--overlap",
+            type=float,
+            default=0.5,
+            help="Доля запросов за места в «горячих» первых рядах, где заказы пересекаются (по умолчанию 0.5)",
+        )
+        parser.add_argument("--buy", type=float, default=0.5, help="Доля покупок среди запросов (по умолчанию 0.5)")
+        parser.add_argument("--seed", type=int, default=None, help="Зерно генератора для повторяемых прогонов")
+        parser.add_argument("--keep", action="store_true", help="Не удалять тестовые данные после прогона")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        session, users = self._seed(options["rows"], options["columns"], options["users"])
+        try:
+            plan = self._plan(rng, options)
+            cookies = self._login(users)
+            url = reverse("cinema:process_booking", args=[session.pk])
+
+            # Отказы 4xx ожидаемы и пишутся в лог на каждый запрос
+            request_logger = logging.getLogger("django.request")
+            level = request_logger.level
+            request_logger.setLevel(logging.ERROR)
+            try:
+                started = time.perf_counter()
+                results = self._run(cookies, url, plan, options["concurrency"])
+                elapsed = time.perf_counter() - started
+            finally:
+                request_logger.setLevel(level)
+
+            self._report(session, results, elapsed, options)
+            double_sold = self._double_sold(session)
+        finally:
+            if not options["keep"]:
+                self._cleanup(session, users)
+
+        if double_sold:
+            raise CommandError(f"Двойная продажа мест: {double_sold}")
+        self.stdout.write(self.style.SUCCESS("Двойных продаж нет"))
+
+    def _seed(self, rows, columns, users_count):
+        stamp = time.time_ns()
+        User = get_user_model()
+        User.objects.bulk_create(
+            [
+                User(email=f"benchmark-{stamp}-{i}@example.com", first_name="Bench", last_name=f"Mark {i}")
+                for i in range(users_count)
+            ]
+        )
+        users = list(User.objects.filter(email__startswith=f"benchmark-{stamp}-"))
+
+        cinema = Cinema.objects.create(name=f"Benchmark {stamp}"[:50], description="-", conditions="-")
+        hall = Hall.objects.create(
+            cinema=cinema,
+            name="Bench",
+            description="-",
+            scheme_data={
+                "rows": rows,
+                "columns": columns,
+                "screen_position": "top",
+                "scheme": [[1] * columns for _ in range(rows)],
+            },
+        )
+        sync_hall_seats(hall)
+
+        today = timezone.localdate()
+        movie = Movie.objects.create(
+            name=f"Benchmark {stamp}"[:50],
+            description="-",
+            trailer_url="https://example.com",
+            start_date=today,
+            end_date=today + timedelta(days=7),
+        )
+        start_time = timezone.now() + timedelta(hours=2)
+        session = Session.objects.create(
+            movie=movie, hall=hall, start_time=start_time, end_time=start_time + timedelta(hours=2), price=Decimal(100)
+        )
+        return session, users
+
+    def _plan(self, rng, options):
+        """
+        Заказы для прогона: (пользователь, места, действие).
+
+        Часть заказов берёт случайный отрезок ряда в первых рядах и конкурирует за него,
+        остальные получают места из общего пула без пересечений, пока пул не кончится.
+        """
+        rows, columns, max_seats = options["rows"], options["columns"], options["max_seats"]
+        hot_rows = max(1, rows // 10)
+        free = [(row, number) for row in range(hot_rows + 1, rows + 1) for number in range(1, columns + 1)]
+        rng.shuffle(free)
+
+        plan = []
+        for i in range(options["requests"]):
+            count = rng.randint(1, max_seats)
+            if rng.random() < options["overlap"] or len(free) < count:
+                row = rng.randint(1, hot_rows)
+                first = rng.randint(1, max(1, columns - count + 1))
+                seats = [(row, number) for number in range(first, min(columns, first + count - 1) + 1)]
+            else:
+                seats = [free.pop() for _ in range(count)]
+            action = "buy" if rng.random() < options["buy"] else "book"
+            plan.append((i % options["users"], seats, action))
+        return plan
+
+    @staticmethod
+    def _login(users):
+        """Сессионные cookie покупателей: клиент не потокобезопасен, поэтому у каждого запроса свой"""
+        cookies = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            cookies.append(client.cookies[settings.SESSION_COOKIE_NAME].value)
+        return cookies
+
+    def _run(self, cookies, url, plan, concurrency):
+        """Выполняет заказы в concurrency потоках; у каждого потока своё соединение с БД"""
+        jobs = queue.SimpleQueue()
+        for job in plan:
+            jobs.put(job)
+        results = []
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        job = jobs.get_nowait()
+                    except queue.Empty:
+                        return
+                    results.append(self._request(cookies, url, job))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    @staticmethod
+    def _request(cookies, url, job):
+        user_index, seats, action = job
+        body = json.dumps({"seats": [{"row": row, "seat": number} for row, number in seats], "action": action})
+        client = Client(HTTP_HOST=next((host for host in settings.ALLOWED_HOSTS if host != "*"), "localhost"))
+        client.cookies[settings.SESSION_COOKIE_NAME] = cookies[user_index]
+
+        started = time.perf_counter()
+        response = client.post(url, body, content_type="application/json")
+        latency = (time.perf_counter() - started) * 1000
+
+        if response.status_code == 200:
+            outcome = "success"
+        elif response.status_code == 400 and response.json().get("error") == CONFLICT_ERROR:
+            outcome = "conflict"
+        else:
+            outcome = "error"
+        return outcome, latency
+
+    def _report(self, session, results, elapsed, options):
+        latencies = sorted(latency for _, latency in results)
+        outcomes = {
+            name: sum(1 for outcome, _ in results if outcome == name) for name in ("success", "conflict", "error")
+        }
+        sold = SessionSeat.objects.filter(session=session, booking__isnull=False).count()
+
+        self.stdout.write(
+            f"Зал {options['rows']}x{options['columns']}, запросов: {len(results)}, "
+            f"потоков: {options['concurrency']}, покупателей: {options['users']}"
+        )
+        self.stdout.write(f"  Пропускная способность: {len(results) / elapsed:.1f} запросов/с за {elapsed:.2f} с")
+        self.stdout.write(
+            f"  Задержка: p50 {statistics.median(latencies):.1f} мс, "
+            f"p99 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.1f} мс"
+        )
+        self.stdout.write(
+            f"  Успешно: {outcomes['success']}, конфликтов: {outcomes['conflict']} "
+            f"({outcomes['conflict'] / len(results):.1%}), ошибок: {outcomes['error']}"
+        )
+        self.stdout.write(f"  Занято мест: {sold}")
+        if outcomes["error"]:
+            self.stdout.write(self.style.WARNING("  Есть ответы с ошибками (не 200 и не конфликт)"))
+
+    @staticmethod
+    def _double_sold(session):
+        """Места сеанса, попавшие больше чем в одну бронь"""
+        return (
+            Booking.seats.through.objects.filter(booking__session=session)
+            .values("seat_id")
+            .annotate(bookings=Count("booking_id"))
+            .filter(bookings__gt=1)
+            .count()
+        )
+
+    @staticmethod
+    def _cleanup(session, users):
+        # Сеанс, брони и места удаляются каскадом вместе с фильмом и кинотеатром
+        seatmap.forget_sessions([session.pk])
+        session.movie.delete()
+        session.hall.cinema.delete()
+        get_user_model().objects.filter(pk__in=[user.pk for user in users]).delete()
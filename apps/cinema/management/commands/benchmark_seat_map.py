@@ -0,0 +1,123 @@
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.cinema import seatmap
+from apps.cinema.models import Booking, Cinema, Hall, Movie, Seat, Session
+from apps.cinema.services import create_booking, get_booked_seat_ids, sync_hall_seats
+
+
+class Command(BaseCommand):
+    help = "Сравнивает старый расчёт занятых мест с битовой картой сеанса (данные откатываются)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=20, help="Рядов в зале (по умолчанию 20)")
+        parser.add_argument("--columns", type=int, default=20, help="Мест в ряду (по умолчанию 20)")
+        parser.add_argument("--bookings", type=int, default=300, help="Количество броней (по умолчанию 300)")
+        parser.add_argument("--iterations", type=int, default=200, help="Повторов замера (по умолчанию 200)")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            session = self._seed(options["rows"], options["columns"], options["bookings"])
+
+            # Коммита не будет, поэтому карту заполняет первое чтение
+            seatmap.forget_sessions([session.pk])
+            legacy = self._measure(lambda: self._legacy_booked_seats(session), options["iterations"])
+            cached = self._measure(lambda: get_booked_seat_ids(session), options["iterations"])
+
+            if sorted(legacy["result"]) != sorted(cached["result"]):
+                self.stdout.write(self.style.ERROR("Результаты расходятся!"))
+
+            seatmap.forget_sessions([session.pk])
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"Зал {options['rows']}x{options['columns']}, броней: {options['bookings']}, "
+            f"занято мест: {len(cached['result'])}"
+        )
+        for name, result in (("Перебор броней", legacy), ("Битовая карта", cached)):
+            self.stdout.write(
+                f"  {name}: медиана {result['median']:.3f} мс, p99 {result['p99']:.3f} мс, "
+                f"запросов к БД за вызов: {result['queries']}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Ускорение по медиане: x{legacy['median'] / cached['median']:.1f}"))
+
+    def _seed(self, rows, columns, bookings_count):
+        user = get_user_model().objects.create_user(
+            email=f"benchmark-{time.time_ns()}@example.com", first_name="Bench", last_name="Mark"
+        )
+        cinema = Cinema.objects.create(name=f"Benchmark {time.time_ns()}"[:50], description="-", conditions="-")
+        hall = Hall.objects.create(
+            cinema=cinema,
+            name="Bench",
+            description="-",
+            scheme_data={
+                "rows": rows,
+                "columns": columns,
+                "screen_position": "top",
+                "scheme": [[1] * columns for _ in range(rows)],
+            },
+        )
+        today = timezone.localdate()
+        movie = Movie.objects.create(
+            name=f"Benchmark {time.time_ns()}"[:50],
+            description="-",
+            trailer_url="https://example.com",
+            start_date=today,
+            end_date=today + timedelta(days=7),
+        )
+        start_time = timezone.now() + timedelta(hours=2)
+        session = Session.objects.create(
+            movie=movie, hall=hall, start_time=start_time, end_time=start_time + timedelta(hours=2), price=Decimal(100)
+        )
+
+        sync_hall_seats(hall)
+        seats = Seat.objects.filter(hall=hall).order_by("row", "number")
+        for i, seat in enumerate(seats[:bookings_count]):
+            create_booking(user, session, [seat], is_paid=i % 2 == 0)
+
+        return session
+
+    @staticmethod
+    def _legacy_booked_seats(session):
+        """Прежний расчёт из BookingView: перебор активных броней и дедупликация списком"""
+        active_bookings = (
+            Booking.objects.filter(session=session)
+            .filter(Q(is_paid=True) | Q(expires_at__gte=timezone.now()))
+            .prefetch_related("seats")
+        )
+        booked_seats = []
+        for booking in active_bookings:
+            for seat in booking.seats.all():
+                seat_id = f"{seat.row}-{seat.number}"
+                if seat_id not in booked_seats:
+                    booked_seats.append(seat_id)
+        return booked_seats
+
+    @staticmethod
+    def _measure(func, iterations):
+        result = func()  # прогрев
+        with CaptureQueriesContext(connection) as queries:
+            func()
+
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        return {
+            "result": result,
+            "median": statistics.median(timings),
+            "p99": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+            "queries": len(queries),
+        }
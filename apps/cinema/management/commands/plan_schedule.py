@@ -0,0 +1,99 @@
+import time
+from datetime import timedelta
+from itertools import groupby
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from apps.cinema.models import Hall, Movie
+from apps.cinema.planner import CLEANING_MINUTES, plan_schedule
+from apps.cinema.scheduling import create_sessions
+
+
+class Command(BaseCommand):
+    help = "Планирует сеансы в свободное время залов по ожидаемой заполняемости (по истории продаж)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=7,
+            help="Количество дней для планирования (по умолчанию 7)",
+        )
+        parser.add_argument(
+            "--start",
+            help="Первый день в формате ГГГГ-ММ-ДД (по умолчанию сегодня)",
+        )
+        parser.add_argument(
+            "--cinema",
+            type=int,
+            action="append",
+            help="Планировать только залы кинотеатра с этим id (можно указать несколько раз)",
+        )
+        parser.add_argument(
+            "--gap",
+            type=int,
+            default=CLEANING_MINUTES,
+            help=f"Перерыв на уборку между сеансами, минут (по умолчанию {CLEANING_MINUTES})",
+        )
+        parser.add_argument(
+            "--min-occupancy",
+            type=float,
+            default=0.0,
+            help="Не ставить сеансы с ожидаемой заполняемостью ниже этой доли зала (0..1)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Показать план, не сохраняя сеансы",
+        )
+
+    def handle(self, *args, **options):
+        first_day = parse_date(options["start"]) if options["start"] else timezone.localdate()
+        if first_day is None:
+            raise CommandError("Дата должна быть в формате ГГГГ-ММ-ДД")
+        if first_day < timezone.localdate():
+            raise CommandError("Нельзя планировать сеансы на прошедшие дни")
+        if options["days"] < 1:
+            raise CommandError("Количество дней должно быть положительным")
+        dates = [first_day + timedelta(days=i) for i in range(options["days"])]
+
+        halls = Hall.objects.select_related("cinema").defer("scheme_data")
+        if options["cinema"]:
+            halls = halls.filter(cinema__in=options["cinema"])
+        halls = list(halls)
+        movies = list(Movie.objects.filter(start_date__lte=dates[-1], end_date__gte=dates[0]))
+        if not halls or not movies:
+            self.stdout.write(self.style.WARNING("Нет залов или фильмов в прокате на эти дни"))
+            return
+
+        started = time.monotonic()
+        sessions, expected = plan_schedule(
+            dates, halls, movies, gap=options["gap"], min_occupancy=options["min_occupancy"]
+        )
+        elapsed = time.monotonic() - started
+
+        capacity = sum(session.capacity for session in sessions)
+        for date, group in groupby(sessions, key=lambda s: timezone.localdate(s.start_time)):
+            group = list(group)
+            self.stdout.write(f"\nПлан на {date.strftime('%d.%m.%Y')}: {len(group)} сеансов")
+            if options["verbosity"] > 1:
+                for session in group:
+                    self.stdout.write(
+                        f"  {timezone.localtime(session.start_time).strftime('%H:%M')}-"
+                        f"{timezone.localtime(session.end_time).strftime('%H:%M')} "
+                        f"{session.hall.cinema.name} - {session.hall.name}: {session.movie.name}, {session.format}"
+                    )
+
+        occupancy = expected / capacity if capacity else 0
+        self.stdout.write(
+            f"\nСеансов: {len(sessions)}, ожидается зрителей: {expected:.0f} из {capacity} мест "
+            f"({occupancy:.0%}), план построен за {elapsed:.2f} с"
+        )
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Пробный запуск: сеансы не сохранены"))
+            return
+
+        create_sessions(sessions)
+        self.stdout.write(self.style.SUCCESS(f"Создано {len(sessions)} сеансов"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.cinema.schedule import rebuild
+
+
+class Command(BaseCommand):
+    help = "Пересобирает денормализованное расписание сеансов (после массовых изменений в обход save())"
+
+    def handle(self, *args, **options):
+        total = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Строк расписания: {total}"))
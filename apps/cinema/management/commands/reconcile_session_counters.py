@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.cinema.models import Session
+from apps.cinema.services import reconcile_session_counters
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает вместимость и число занятых мест сеансов по инвентарю мест"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Пересчитать и прошедшие сеансы (по умолчанию только предстоящие)",
+        )
+
+    def handle(self, *args, **options):
+        sessions = Session.objects.all()
+        if not options["all"]:
+            sessions = sessions.filter(end_time__gte=timezone.now())
+
+        updated = reconcile_session_counters(sessions)
+        if updated:
+            self.stdout.write(self.style.WARNING(f"Исправлено сеансов: {updated}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Счётчики всех сеансов совпадают"))
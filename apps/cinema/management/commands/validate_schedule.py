@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from modeltranslation.utils import get_translation_fields
+
+from apps.cinema.models import Hall, Session
+from apps.cinema.scheduling import find_overlaps
+
+
+class Command(BaseCommand):
+    help = "Проверяет, что сеансы одного зала не пересекаются по времени (один запрос на всё расписание)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--upcoming",
+            action="store_true",
+            help="Проверять только ещё не закончившиеся сеансы",
+        )
+
+    def handle(self, *args, **options):
+        sessions = Session.objects.all()
+        if options["upcoming"]:
+            sessions = sessions.filter(end_time__gt=timezone.now())
+
+        overlaps = find_overlaps(sessions)
+        if not overlaps:
+            self.stdout.write(self.style.SUCCESS("Пересечений сеансов нет"))
+            return
+
+        names = get_translation_fields("name")
+        halls = (
+            Hall.objects.select_related("cinema")
+            .only(*names, *(f"cinema__{field}" for field in names))
+            .in_bulk({row[0] for row in overlaps})
+        )
+        time_format = "%d.%m.%Y %H:%M"
+        for hall_id, (first_id, first_start, first_end), (second_id, second_start, second_end) in overlaps:
+            self.stdout.write(
+                f"  {halls[hall_id]}: сеанс #{first_id} "
+                f"{timezone.localtime(first_start).strftime(time_format)}-{timezone.localtime(first_end).strftime('%H:%M')}"
+                f" и сеанс #{second_id} "
+                f"{timezone.localtime(second_start).strftime(time_format)}-{timezone.localtime(second_end).strftime('%H:%M')}"
+            )
+        raise CommandError(f"Пересекающихся пар сеансов: {len(overlaps)}")
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def backfill_session_seats(apps, schema_editor):
+    """Переносит места из действующих бронирований в инвентарь сеансов"""
+    Booking = apps.get_model("cinema", "Booking")
+    SessionSeat = apps.get_model("cinema", "SessionSeat")
+
+    active_bookings = Booking.objects.filter(Q(is_paid=True) | Q(expires_at__gte=timezone.now())).prefetch_related(
+        "seats"
+    )
+
+    for booking in active_bookings.iterator(chunk_size=500):
+        SessionSeat.objects.bulk_create(
+            [
+                SessionSeat(
+                    session_id=booking.session_id,
+                    seat_id=seat.pk,
+                    booking_id=booking.pk,
+                    state="sold" if booking.is_paid else "held",
+                    held_until=None if booking.is_paid else booking.expires_at,
+                )
+                for seat in booking.seats.all()
+            ],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cinema", "0014_alter_hall_banner"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SessionSeat",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[("free", "Свободно"), ("held", "Забронировано"), ("sold", "Продано")],
+                        default="free",
+                        max_length=4,
+                        verbose_name="Состояние",
+                    ),
+                ),
+                ("held_until", models.DateTimeField(blank=True, null=True, verbose_name="Удерживается до")),
+                (
+                    "booking",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="seat_states",
+                        to="cinema.booking",
+                        verbose_name="Бронирование",
+                    ),
+                ),
+                (
+                    "seat",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="session_states",
+                        to="cinema.seat",
+                        verbose_name="Место",
+                    ),
+                ),
+                (
+                    "session",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="seat_states",
+                        to="cinema.session",
+                        verbose_name="Сеанс",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Место на сеансе",
+                "verbose_name_plural": "Места на сеансах",
+                "constraints": [models.UniqueConstraint(fields=("session", "seat"), name="unique_session_seat")],
+            },
+        ),
+        migrations.RunPython(backfill_session_seats, migrations.RunPython.noop),
+    ]
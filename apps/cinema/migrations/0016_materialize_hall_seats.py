@@ -0,0 +1,50 @@
+from django.db import migrations
+
+from apps.cinema.scheme import iter_scheme_seats
+
+
+def materialize_hall_seats(apps, schema_editor):
+    """
+    Приводит строки Seat существующих залов в соответствие со схемой.
+
+    Замороженная копия services.sync_hall_seats на исторических моделях: недостающие
+    места создаются, лишние без броней удаляются, а лишние с бронями помечаются
+    недоступными, чтобы их нельзя было забронировать.
+    """
+    Hall = apps.get_model("cinema", "Hall")
+    Seat = apps.get_model("cinema", "Seat")
+    BookingSeat = apps.get_model("cinema", "Booking").seats.through
+
+    for hall in Hall.objects.all().iterator():
+        wanted = set(iter_scheme_seats(hall.scheme_data))
+        existing = {
+            (row, number): (pk, is_available)
+            for pk, row, number, is_available in Seat.objects.filter(hall_id=hall.pk).values_list(
+                "pk", "row", "number", "is_available"
+            )
+        }
+
+        Seat.objects.bulk_create(
+            [Seat(hall_id=hall.pk, row=row, number=number) for row, number in wanted - existing.keys()],
+            ignore_conflicts=True,
+        )
+
+        restored = [pk for position, (pk, is_available) in existing.items() if position in wanted and not is_available]
+        if restored:
+            Seat.objects.filter(pk__in=restored).update(is_available=True)
+
+        removed = {pk for position, (pk, _) in existing.items() if position not in wanted}
+        if removed:
+            booked = set(BookingSeat.objects.filter(seat_id__in=removed).values_list("seat_id", flat=True))
+            Seat.objects.filter(pk__in=removed - booked).delete()
+            Seat.objects.filter(pk__in=booked, is_available=True).update(is_available=False)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cinema", "0015_sessionseat"),
+    ]
+
+    operations = [
+        migrations.RunPython(materialize_hall_seats, migrations.RunPython.noop),
+    ]
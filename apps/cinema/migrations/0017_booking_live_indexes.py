@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cinema", "0016_materialize_hall_seats"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                condition=models.Q(("is_paid", False)), fields=["expires_at"], name="booking_unpaid_expires_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sessionseat",
+            index=models.Index(
+                condition=models.Q(("state", "free"), _negated=True),
+                fields=["session", "state", "held_until"],
+                name="session_seat_live_idx",
+            ),
+        ),
+    ]
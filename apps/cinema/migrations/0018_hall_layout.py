@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:53
+
+from django.db import migrations, models
+
+from apps.cinema.scheme import compile_layout
+
+
+def compile_hall_layouts(apps, schema_editor):
+    """Компилирует схемы существующих залов"""
+    Hall = apps.get_model("cinema", "Hall")
+
+    for hall in Hall.objects.all().iterator():
+        hall.layout = compile_layout(hall.scheme_data)
+        hall.layout_version = 1
+        hall.save(update_fields=["layout", "layout_version"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cinema", "0017_booking_live_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="hall",
+            name="layout",
+            field=models.JSONField(default=dict, editable=False, verbose_name="Скомпилированная схема"),
+        ),
+        migrations.AddField(
+            model_name="hall",
+            name="layout_version",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Версия схемы"),
+        ),
+        migrations.RunPython(compile_hall_layouts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cinema", "0018_hall_layout"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="admission_rate",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Сколько посетителей в минуту пропускать к бронированию каждого сеанса; 0 — без очереди",
+                verbose_name="Очередь на бронирование",
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:57
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_session_occupancy(apps, schema_editor):
+    """Заполняет вместимость и занятость существующих сеансов"""
+    Session = apps.get_model("cinema", "Session")
+    SessionSeat = apps.get_model("cinema", "SessionSeat")
+
+    booked = dict(
+        SessionSeat.objects.exclude(state="free")
+        .values("session_id")
+        .annotate(n=Count("id"))
+        .values_list("session_id", "n")
+    )
+    sessions = list(Session.objects.select_related("hall"))
+    for session in sessions:
+        session.capacity = session.hall.layout.get("capacity", 0)
+        session.booked_count = booked.get(session.pk, 0)
+    Session.objects.bulk_update(sessions, ["capacity", "booked_count"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cinema", "0019_movie_admission_rate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="session",
+            name="booked_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Занято мест"),
+        ),
+        migrations.AddField(
+            model_name="session",
+            name="capacity",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Мест в зале"),
+        ),
+        migrations.RunPython(fill_session_occupancy, migrations.RunPython.noop),
+    ]
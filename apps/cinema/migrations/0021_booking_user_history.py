@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cinema", "0020_session_occupancy"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(fields=["user", "-created_at", "-id"], name="booking_user_history_idx"),
+        ),
+    ]
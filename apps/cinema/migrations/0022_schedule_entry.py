@@ -0,0 +1,126 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_schedule(apps, schema_editor):
+    """Строит строки расписания для существующих сеансов"""
+    Session = apps.get_model("cinema", "Session")
+    ScheduleEntry = apps.get_model("cinema", "ScheduleEntry")
+
+    def translated(target, source):
+        return {f"{target}_{lang}": getattr(source, f"name_{lang}") for lang in settings.MODELTRANSLATION_LANGUAGES}
+
+    sessions = Session.objects.select_related("movie", "hall__cinema").defer("hall__scheme_data", "hall__layout")
+    entries = []
+    for session in sessions.iterator(chunk_size=1000):
+        hall, movie = session.hall, session.movie
+        entries.append(
+            ScheduleEntry(
+                session_id=session.pk,
+                cinema_id=hall.cinema_id,
+                hall_id=hall.pk,
+                movie_id=movie.pk,
+                date=timezone.localdate(session.start_time),
+                start_time=session.start_time,
+                format=session.format,
+                price=session.price,
+                movie_name=movie.name,
+                movie_poster=movie.poster.name or "",
+                cinema_name=hall.cinema.name,
+                hall_name=hall.name,
+                **translated("movie_name", movie),
+                **translated("cinema_name", hall.cinema),
+                **translated("hall_name", hall),
+            )
+        )
+    ScheduleEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cinema", "0021_booking_user_history"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScheduleEntry",
+            fields=[
+                (
+                    "session",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="schedule_entry",
+                        serialize=False,
+                        to="cinema.session",
+                        verbose_name="Сеанс",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Дата (местная)")),
+                ("start_time", models.DateTimeField(verbose_name="Начало сеанса")),
+                (
+                    "format",
+                    models.CharField(
+                        choices=[("2D", "2D"), ("3D", "3D"), ("IMAX", "IMAX")], max_length=10, verbose_name="Формат"
+                    ),
+                ),
+                ("price", models.DecimalField(decimal_places=2, max_digits=10, verbose_name="Цена")),
+                ("movie_name", models.CharField(max_length=50, verbose_name="Фильм")),
+                ("movie_name_ru", models.CharField(max_length=50, null=True, verbose_name="Фильм")),
+                ("movie_name_uk", models.CharField(max_length=50, null=True, verbose_name="Фильм")),
+                ("movie_poster", models.CharField(blank=True, max_length=255, verbose_name="Постер")),
+                ("cinema_name", models.CharField(max_length=50, verbose_name="Кинотеатр")),
+                ("cinema_name_ru", models.CharField(max_length=50, null=True, verbose_name="Кинотеатр")),
+                ("cinema_name_uk", models.CharField(max_length=50, null=True, verbose_name="Кинотеатр")),
+                ("hall_name", models.CharField(max_length=20, verbose_name="Зал")),
+                ("hall_name_ru", models.CharField(max_length=20, null=True, verbose_name="Зал")),
+                ("hall_name_uk", models.CharField(max_length=20, null=True, verbose_name="Зал")),
+                (
+                    "cinema",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="cinema.cinema",
+                        verbose_name="Кинотеатр",
+                    ),
+                ),
+                (
+                    "hall",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="cinema.hall",
+                        verbose_name="Зал",
+                    ),
+                ),
+                (
+                    "movie",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="cinema.movie",
+                        verbose_name="Фильм",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Строка расписания",
+                "verbose_name_plural": "Расписание",
+                "indexes": [
+                    models.Index(fields=["start_time"], name="schedule_start_idx"),
+                    models.Index(fields=["date", "start_time"], name="schedule_date_idx"),
+                    models.Index(fields=["cinema", "date", "start_time"], name="schedule_cinema_date_idx"),
+                    models.Index(fields=["movie", "date", "start_time"], name="schedule_movie_date_idx"),
+                    models.Index(fields=["hall", "date", "start_time"], name="schedule_hall_date_idx"),
+                ],
+            },
+        ),
+        migrations.RunPython(fill_schedule, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cinema", "0022_schedule_entry"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="session",
+            index=models.Index(fields=["hall", "start_time"], name="session_hall_start_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="session",
+            index=models.Index(fields=["movie", "start_time"], name="session_movie_start_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="session",
+            index=models.Index(fields=["start_time"], name="session_start_idx"),
+        ),
+    ]
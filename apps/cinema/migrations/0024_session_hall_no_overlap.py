@@ -0,0 +1,80 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:07
+
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations
+from django.db.models import F, FilteredRelation, Q
+from django.utils.timezone import localtime
+
+import apps.cinema.models
+
+OVERLAPS_SHOWN = 20
+
+
+def check_no_overlaps(apps, schema_editor):
+    """
+    Старый генератор расписания проверял только совпадение начала, поэтому в залах бывают
+    пересекающиеся сеансы. Миграция их не удаляет (на них могут быть брони): при пересечениях
+    она останавливается со списком пар, а администратор разбирает их сам и запускает её снова.
+    """
+    Session = apps.get_model("cinema", "Session")
+
+    pairs = list(
+        Session.objects.annotate(
+            other=FilteredRelation(
+                "hall__session",
+                condition=Q(
+                    hall__session__pk__gt=F("pk"),
+                    hall__session__start_time__lt=F("end_time"),
+                    hall__session__end_time__gt=F("start_time"),
+                ),
+            )
+        )
+        .filter(other__isnull=False)
+        .order_by("hall_id", "start_time", "other__start_time")
+        .values_list("hall_id", "pk", "start_time", "other__pk", "other__start_time")
+    )
+    if not pairs:
+        return
+
+    lines = [
+        f"  зал #{hall_id}: сеанс #{first_id} ({localtime(first_start):%d.%m.%Y %H:%M}) "
+        f"и сеанс #{second_id} ({localtime(second_start):%d.%m.%Y %H:%M})"
+        for hall_id, first_id, first_start, second_id, second_start in pairs[:OVERLAPS_SHOWN]
+    ]
+    if len(pairs) > OVERLAPS_SHOWN:
+        lines.append(f"  ... и ещё {len(pairs) - OVERLAPS_SHOWN}")
+    raise RuntimeError(
+        f"Ограничение session_hall_no_overlap не может быть создано, пересекающихся пар сеансов: {len(pairs)}\n"
+        + "\n".join(lines)
+        + "\nПолный список: python manage.py validate_schedule. Перенесите или удалите лишние сеансы "
+        "в админке работающей версии сайта и повторите migrate."
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cinema", "0023_session_start_indexes"),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.RunPython(check_no_overlaps, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="session",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                expressions=[
+                    ("hall", "="),
+                    (
+                        apps.cinema.models.TsTzRange(
+                            "start_time", "end_time", django.contrib.postgres.fields.ranges.RangeBoundary()
+                        ),
+                        "&&",
+                    ),
+                ],
+                name="session_hall_no_overlap",
+                violation_error_message="В этом зале уже есть сеанс в это время",
+            ),
+        ),
+    ]
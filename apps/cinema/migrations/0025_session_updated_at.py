@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:40
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_schedule_times(apps, schema_editor):
+    """Окончание и время изменения строк расписания — из их сеансов"""
+    Session = apps.get_model("cinema", "Session")
+    ScheduleEntry = apps.get_model("cinema", "ScheduleEntry")
+
+    session = Session.objects.filter(pk=OuterRef("session_id"))
+    ScheduleEntry.objects.update(
+        end_time=Subquery(session.values("end_time")),
+        updated_at=Subquery(session.values("updated_at")),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cinema", "0024_session_hall_no_overlap"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="session",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Изменено"),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="scheduleentry",
+            name="end_time",
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name="Окончание сеанса"),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="scheduleentry",
+            name="updated_at",
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name="Изменено"),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_schedule_times, migrations.RunPython.noop),
+    ]
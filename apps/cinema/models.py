@@ -1,13 +1,15 @@
 from datetime import timedelta
 
 from django.conf import settings
-from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import ArrayField, DateTimeRangeField, RangeBoundary, RangeOperators
 from django.db import models
 from django.utils import timezone
 
 from apps.core.models import Gallery, SeoBlock
 
-from .enums import MovieFormat
+from .enums import MovieFormat, SeatState
+from .scheme import compile_layout
 
 # Create your models here.
 
@@ -25,6 +27,11 @@ class Movie(models.Model):
         default=list,
         verbose_name="Форматы показа",
     )
+    admission_rate = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Очередь на бронирование",
+        help_text="Сколько посетителей в минуту пропускать к бронированию каждого сеанса; 0 — без очереди",
+    )
     seo_block = models.OneToOneField(SeoBlock, on_delete=models.SET_NULL, blank=True, null=True)
 
     class Meta:
@@ -71,6 +78,8 @@ class Hall(models.Model):
     description = models.TextField(verbose_name="Описание")
     banner = models.ImageField(upload_to="hall/banners/")
     scheme_data = models.JSONField(verbose_name="Схема зала")
+    layout = models.JSONField(default=dict, editable=False, verbose_name="Скомпилированная схема")
+    layout_version = models.PositiveIntegerField(default=0, editable=False, verbose_name="Версия схемы")
     gallery = models.ForeignKey(Gallery, on_delete=models.SET_NULL, blank=True, null=True)
     seo_block = models.OneToOneField(SeoBlock, on_delete=models.SET_NULL, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True, null=True)
@@ -80,6 +89,21 @@ class Hall(models.Model):
         verbose_name = "Зал"
         unique_together = ["cinema", "name"]
 
+    def save(self, *args, **kwargs):
+        # Компилируем схему при сохранении; версия растёт, только если схема действительно изменилась
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "scheme_data" in update_fields:
+            layout = compile_layout(self.scheme_data)
+            if layout != self.layout:
+                self.layout = layout
+                self.layout_version += 1
+                if update_fields is not None:
+                    kwargs["update_fields"] = {*update_fields, "layout", "layout_version"}
+                if self.pk:
+                    self.session_set.update(capacity=layout["capacity"])
+
+        super().save(*args, **kwargs)
+
     def get_gallery_images(self):
         """Возвращает все изображения из галереи зала"""
         if self.gallery:
@@ -90,6 +114,11 @@ class Hall(models.Model):
         return f"{self.cinema.name} - Зал {self.name}"
 
 
+class TsTzRange(models.Func):
+    function = "TSTZRANGE"
+    output_field = DateTimeRangeField()
+
+
 class Session(models.Model):
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE, verbose_name="Фильм")
     hall = models.ForeignKey(Hall, on_delete=models.CASCADE, verbose_name="Зал")
@@ -102,6 +131,24 @@ class Session(models.Model):
         default=MovieFormat.TWO_D,
         verbose_name="Формат",
     )
+    # Денормализованная занятость: мест в зале и занятых мест (поддерживается services)
+    capacity = models.PositiveIntegerField(default=0, editable=False, verbose_name="Мест в зале")
+    booked_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Занято мест")
+    # Время последнего изменения сеанса (не меняется при бронированиях: счётчики обновляет update())
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Изменено")
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.capacity:
+            self.capacity = self.hall.layout.get("capacity", 0)
+        super().save(*args, **kwargs)
+
+    @property
+    def seats_left(self):
+        return max(self.capacity - self.booked_count, 0)
+
+    @property
+    def is_sold_out(self):
+        return self.capacity > 0 and self.booked_count >= self.capacity
 
     def __str__(self):
         return f"{self.movie.name} - {self.start_time.strftime('%Y/%m/%d')}"
@@ -109,6 +156,24 @@ class Session(models.Model):
     class Meta:
         verbose_name_plural = "Сеансы"
         verbose_name = "Сеанс"
+        # Сеансы зала и фильма выбираются по окну дней (apps.core.dates.in_days), уборка — по началу
+        indexes = [
+            models.Index(fields=["hall", "start_time"], name="session_hall_start_idx"),
+            models.Index(fields=["movie", "start_time"], name="session_movie_start_idx"),
+            models.Index(fields=["start_time"], name="session_start_idx"),
+        ]
+        constraints = [
+            # Сеансы одного зала не пересекаются по времени [начало, конец)
+            ExclusionConstraint(
+                name="session_hall_no_overlap",
+                index_type="GIST",
+                expressions=[
+                    ("hall", RangeOperators.EQUAL),
+                    (TsTzRange("start_time", "end_time", RangeBoundary()), RangeOperators.OVERLAPS),
+                ],
+                violation_error_message="В этом зале уже есть сеанс в это время",
+            ),
+        ]
 
 
 class Seat(models.Model):
@@ -125,6 +190,68 @@ class Seat(models.Model):
         return f"Ряд {self.row},  место {self.number}"
 
 
+class ScheduleEntry(models.Model):
+    """
+    Строка публичного расписания: сеанс вместе с данными фильма, зала и кинотеатра,
+    чтобы фильтры расписания читали одну таблицу без join'ов. Поддерживается schedule.py.
+    """
+
+    session = models.OneToOneField(
+        Session, on_delete=models.CASCADE, primary_key=True, related_name="schedule_entry", verbose_name="Сеанс"
+    )
+    cinema = models.ForeignKey(
+        Cinema, on_delete=models.CASCADE, db_index=False, related_name="+", verbose_name="Кинотеатр"
+    )
+    hall = models.ForeignKey(Hall, on_delete=models.CASCADE, db_index=False, related_name="+", verbose_name="Зал")
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, db_index=False, related_name="+", verbose_name="Фильм")
+    date = models.DateField(verbose_name="Дата (местная)")
+    start_time = models.DateTimeField(verbose_name="Начало сеанса")
+    end_time = models.DateTimeField(verbose_name="Окончание сеанса")
+    format = models.CharField(max_length=10, choices=MovieFormat.choices, verbose_name="Формат")
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Цена")
+    movie_name = models.CharField(max_length=50, verbose_name="Фильм")
+    # Путь к постеру в хранилище; строкой, чтобы удаление строки не трогало файл фильма
+    movie_poster = models.CharField(max_length=255, blank=True, verbose_name="Постер")
+    cinema_name = models.CharField(max_length=50, verbose_name="Кинотеатр")
+    hall_name = models.CharField(max_length=20, verbose_name="Зал")
+    # Когда строка последний раз менялась: изменение сеанса или названий фильма, зала, кинотеатра
+    updated_at = models.DateTimeField(verbose_name="Изменено")
+
+    # Занятость меняется с каждой бронью и в расписание не копируется:
+    # счётчики подставляет schedule.attach_occupancy из Session
+    capacity = 0
+    booked_count = 0
+
+    class Meta:
+        verbose_name = "Строка расписания"
+        verbose_name_plural = "Расписание"
+        # Под каждую комбинацию фильтров расписания, с сортировкой по началу сеанса
+        indexes = [
+            models.Index(fields=["start_time"], name="schedule_start_idx"),
+            models.Index(fields=["date", "start_time"], name="schedule_date_idx"),
+            models.Index(fields=["cinema", "date", "start_time"], name="schedule_cinema_date_idx"),
+            models.Index(fields=["movie", "date", "start_time"], name="schedule_movie_date_idx"),
+            models.Index(fields=["hall", "date", "start_time"], name="schedule_hall_date_idx"),
+        ]
+
+    @property
+    def movie_poster_url(self):
+        from django.core.files.storage import default_storage
+
+        return default_storage.url(self.movie_poster) if self.movie_poster else ""
+
+    @property
+    def seats_left(self):
+        return max(self.capacity - self.booked_count, 0)
+
+    @property
+    def is_sold_out(self):
+        return self.capacity > 0 and self.booked_count >= self.capacity
+
+    def __str__(self):
+        return f"{self.movie_name} - {self.start_time.strftime('%Y/%m/%d %H:%M')}"
+
+
 class Booking(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name="Пользователь")
     session = models.ForeignKey(Session, on_delete=models.CASCADE, verbose_name="Сеанс")
@@ -138,16 +265,20 @@ class Booking(models.Model):
     class Meta:
         verbose_name = "Бронирование"
         verbose_name_plural = "Бронирования"
+        indexes = [
+            # Очередь для очистки истёкших неоплаченных броней
+            models.Index(fields=["expires_at"], condition=models.Q(is_paid=False), name="booking_unpaid_expires_idx"),
+            # История бронирований пользователя (keyset-пагинация по created_at, id)
+            models.Index(fields=["user", "-created_at", "-id"], name="booking_user_history_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         # если не указано время истечения — ставим 15 минут
         if not self.expires_at and not self.is_paid:
             self.expires_at = timezone.now() + timedelta(minutes=15)
 
-        # Обновляем total_amount только если объект уже сохранен (есть ID) и места добавлены
-        if self.pk and self.ticket_price and self.seats.exists():
-            self.total_amount = self.ticket_price * self.seats.count()
-
+        # total_amount считается при создании брони (services.create_booking) по списку мест,
+        # поэтому сохранение не обращается к местам
         super().save(*args, **kwargs)
 
     def is_expired(self):
@@ -155,3 +286,43 @@ class Booking(models.Model):
 
     def __str__(self):
         return f"Бронь №{self.id} — {self.user or 'Гость'}"
+
+
+class SessionSeat(models.Model):
+    """Состояние места на конкретном сеансе: одна строка на пару (сеанс, место)"""
+
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name="seat_states", verbose_name="Сеанс")
+    seat = models.ForeignKey(Seat, on_delete=models.CASCADE, related_name="session_states", verbose_name="Место")
+    state = models.CharField(
+        max_length=4,
+        choices=SeatState.choices,
+        default=SeatState.FREE,
+        verbose_name="Состояние",
+    )
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="seat_states",
+        verbose_name="Бронирование",
+    )
+    held_until = models.DateTimeField(blank=True, null=True, verbose_name="Удерживается до")
+
+    class Meta:
+        verbose_name = "Место на сеансе"
+        verbose_name_plural = "Места на сеансах"
+        constraints = [
+            models.UniqueConstraint(fields=["session", "seat"], name="unique_session_seat"),
+        ]
+        indexes = [
+            # Только занятые места: проверка доступности читает небольшое горячее множество
+            models.Index(
+                fields=["session", "state", "held_until"],
+                condition=~models.Q(state=SeatState.FREE),
+                name="session_seat_live_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.session_id}: {self.seat} — {self.get_state_display()}"
@@ -0,0 +1,317 @@
+"""
+Планирование расписания по ожидаемой заполняемости залов (команда plan_schedule).
+
+Спрос оценивается по прошедшим сеансам (DemandModel): среднее число занятых мест на сеанс
+фильма, сглаженное к среднему по всем фильмам, с поправками на час начала и формат. Сеанс
+фильма продаёт не больше мест, чем есть в зале, а каждый следующий сеанс того же фильма
+в том же кинотеатре в тот же день забирает часть зрителей у предыдущих (SESSION_DECAY).
+
+План строится в два шага:
+- жадное заполнение: залы кинотеатра от большего к меньшему заполняются сеансами подряд
+  с уборкой между ними, на каждое свободное время выбирается фильм и формат с наибольшим
+  ожидаемым числом зрителей на минуту занятого зала;
+- исправление: фильм и формат каждого сеанса заменяются другим или меняются местами с
+  другим сеансом кинотеатра, пока это увеличивает ожидаемое число зрителей за день и
+  фильм помещается в свободное время зала.
+
+Учитываются даты проката и форматы фильмов, вместимость зала, уже существующие сеансы и
+перерывы на уборку; сохраняются сеансы через scheduling.create_sessions.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from statistics import median
+
+from django.utils import timezone
+
+from apps.core.dates import day_start
+
+from .enums import MovieFormat
+from .models import ScheduleEntry, Session
+from .scheduling import load_timelines
+
+HISTORY_DAYS = 28
+# Вес среднего по всем фильмам при оценке спроса на фильм, в сеансах
+PRIOR_SESSIONS = 5
+# Доля зрителей, которая остаётся у каждого следующего сеанса фильма в кинотеатре за день
+SESSION_DECAY = 0.7
+# Заполняемость, которую ждём без истории продаж
+DEFAULT_OCCUPANCY = 0.5
+DEFAULT_DURATION = timedelta(minutes=120)
+CLEANING_MINUTES = 15
+OPENING = timedelta(hours=10)
+LAST_START = timedelta(hours=23)
+STEP = timedelta(minutes=5)
+REPAIR_ROUNDS = 3
+PRICES = {
+    MovieFormat.TWO_D: Decimal(100),
+    MovieFormat.THREE_D: Decimal(120),
+    MovieFormat.IMAX: Decimal(150),
+}
+
+
+def _factors(booked, sessions, mean):
+    """Поправочные коэффициенты групп к среднему, сглаженные к 1"""
+    return {
+        key: (booked[key] + PRIOR_SESSIONS * mean) / ((sessions[key] + PRIOR_SESSIONS) * mean)
+        for key in sessions
+        if mean
+    }
+
+
+class DemandModel:
+    """Ожидаемое число зрителей сеанса по истории продаж за HISTORY_DAYS дней"""
+
+    def __init__(self, movies, mean, hours, formats, durations):
+        self.movies = movies
+        self.mean = mean
+        self.hours = hours
+        self.formats = formats
+        self.durations = durations
+
+    @classmethod
+    def from_history(cls, before, default_capacity=0):
+        """Модель по сеансам, начавшимся до дня before (одним запросом)"""
+        booked = {"movie": defaultdict(int), "hour": defaultdict(int), "format": defaultdict(int)}
+        sessions = {"movie": defaultdict(int), "hour": defaultdict(int), "format": defaultdict(int)}
+        durations = defaultdict(list)
+
+        rows = Session.objects.filter(
+            start_time__gte=day_start(before - timedelta(days=HISTORY_DAYS)),
+            start_time__lt=min(timezone.now(), day_start(before)),
+            capacity__gt=0,
+        ).values_list("movie_id", "start_time", "end_time", "format", "booked_count")
+        for movie_id, start_time, end_time, fmt, booked_count in rows.iterator():
+            for group, key in (("movie", movie_id), ("hour", timezone.localtime(start_time).hour), ("format", fmt)):
+                booked[group][key] += booked_count
+                sessions[group][key] += 1
+            durations[movie_id].append(end_time - start_time)
+
+        total = sum(sessions["movie"].values())
+        mean = sum(booked["movie"].values()) / total if total else default_capacity * DEFAULT_OCCUPANCY
+        movies = {
+            movie_id: (booked["movie"][movie_id] + PRIOR_SESSIONS * mean) / (count + PRIOR_SESSIONS)
+            for movie_id, count in sessions["movie"].items()
+        }
+        return cls(
+            movies,
+            mean,
+            _factors(booked["hour"], sessions["hour"], mean),
+            _factors(booked["format"], sessions["format"], mean),
+            {movie_id: median(values) for movie_id, values in durations.items()},
+        )
+
+    def demand(self, movie_id, hour, fmt):
+        """Зрители сеанса, начинающегося в местный час hour, без учёта вместимости зала и других сеансов фильма"""
+        return self.movies.get(movie_id, self.mean) * self.hours.get(hour, 1) * self.formats.get(fmt, 1)
+
+    def duration(self, movie_id):
+        return self.durations.get(movie_id, DEFAULT_DURATION)
+
+
+class _Slot:
+    """Запланированный сеанс; window_end — начало следующего занятого интервала зала"""
+
+    __slots__ = ("hall", "capacity", "start", "hour", "movie", "format", "demand", "window_end")
+
+    def __init__(self, hall, capacity, start, hour, movie, fmt, demand):
+        self.hall = hall
+        self.capacity = capacity
+        self.start = start
+        self.hour = hour
+        self.movie = movie
+        self.format = fmt
+        self.demand = demand
+        self.window_end = None
+
+
+def _formats(movie):
+    return movie.formats or [MovieFormat.TWO_D]
+
+
+def _movie_value(slots, shown):
+    """Ожидаемые зрители сеансов одного фильма в кинотеатре за день; shown — уже существующие сеансы"""
+    total = 0
+    for rank, slot in enumerate(sorted(slots, key=lambda slot: -slot.demand), start=shown):
+        total += min(slot.capacity, slot.demand * SESSION_DECAY**rank)
+    return total
+
+
+class _CinemaDay:
+    """Сеансы одного кинотеатра за день, сгруппированные по фильмам"""
+
+    def __init__(self, day, movies, shown):
+        self.day = day
+        self.movies = movies
+        self.shown = shown
+        self.slots = []
+        self.by_movie = defaultdict(list)
+
+    def count(self, movie_id):
+        return self.shown.get(movie_id, 0) + len(self.by_movie[movie_id])
+
+    def add(self, slot):
+        self.slots.append(slot)
+        self.by_movie[slot.movie.id].append(slot)
+
+    def value(self, movie_ids):
+        return sum(_movie_value(self.by_movie[pk], self.shown.get(pk, 0)) for pk in movie_ids)
+
+    def total(self):
+        return self.value(list(self.by_movie))
+
+
+class Planner:
+    def __init__(self, model, gap=CLEANING_MINUTES, min_occupancy=0.0):
+        self.model = model
+        self.gap = timedelta(minutes=gap)
+        self.min_occupancy = min_occupancy
+
+    def _fits(self, slot, movie):
+        # Фильмы дня уже отобраны по датам проката; другой фильм должен уложиться до следующего сеанса
+        return slot.window_end is None or slot.start + self.model.duration(movie.id) + self.gap <= slot.window_end
+
+    def _next_start(self, end):
+        # Следующее начало — после уборки, по сетке STEP
+        start = end + self.gap
+        remainder = (start - day_start(timezone.localdate(start))) % STEP
+        return start + (STEP - remainder if remainder else timedelta())
+
+    def fill_hall(self, hall, cinema_day, timeline):
+        """Жадно заполняет день зала сеансами, выбирая лучший фильм на каждое свободное время"""
+        capacity = hall.layout.get("capacity", 0)
+        if not capacity or not cinema_day.movies:
+            return []
+
+        shortest = min(self.model.duration(movie.id) for movie in cinema_day.movies)
+        # Сегодня — не раньше ближайшего слота после уборки от текущего момента; если он позже
+        # последнего начала, день пропускается
+        start = max(day_start(cinema_day.day) + OPENING, self._next_start(timezone.now()))
+        last_start = day_start(cinema_day.day) + LAST_START
+        placed = []
+        while start <= last_start:
+            busy_until = timeline.busy_until(start - self.gap, start + shortest + self.gap)
+            if busy_until is not None:
+                start = self._next_start(busy_until)
+                continue
+
+            hour = timezone.localtime(start).hour
+            best = None
+            for movie in cinema_day.movies:
+                duration = self.model.duration(movie.id)
+                if not timeline.is_free(start - self.gap, start + duration + self.gap):
+                    continue
+                decay = SESSION_DECAY ** cinema_day.count(movie.id)
+                for fmt in _formats(movie):
+                    demand = self.model.demand(movie.id, hour, fmt)
+                    seats = min(capacity, demand * decay)
+                    score = seats / (duration + self.gap).total_seconds()
+                    if best is None or score > best[0]:
+                        best = (score, seats, movie, fmt, demand, duration)
+
+            if best is None or best[1] < self.min_occupancy * capacity:
+                start += STEP
+                continue
+
+            _, _, movie, fmt, demand, duration = best
+            slot = _Slot(hall, capacity, start, hour, movie, fmt, demand)
+            timeline.add(start, start + duration)
+            cinema_day.add(slot)
+            placed.append(slot)
+            start = self._next_start(start + duration)
+
+        for slot in placed:
+            slot.window_end = timeline.next_start(slot.start)
+        return placed
+
+    def _try(self, cinema_day, changes):
+        """Применяет замены [(сеанс, фильм, формат)], если они увеличивают ожидаемых зрителей"""
+        old = [(slot, slot.movie, slot.format, slot.demand) for slot, _, _ in changes]
+        affected = {slot.movie.id for slot, _, _ in changes} | {movie.id for _, movie, _ in changes}
+        before = cinema_day.value(affected)
+
+        def assign(slot, movie, fmt, demand):
+            cinema_day.by_movie[slot.movie.id].remove(slot)
+            slot.movie, slot.format, slot.demand = movie, fmt, demand
+            cinema_day.by_movie[movie.id].append(slot)
+
+        for slot, movie, fmt in changes:
+            assign(slot, movie, fmt, self.model.demand(movie.id, slot.hour, fmt))
+        if cinema_day.value(affected) > before + 1e-9:
+            return True
+        for slot, movie, fmt, demand in reversed(old):
+            assign(slot, movie, fmt, demand)
+        return False
+
+    def repair(self, cinema_day):
+        """Заменяет и меняет местами фильмы сеансов кинотеатра, пока ожидаемых зрителей становится больше"""
+        for _ in range(REPAIR_ROUNDS):
+            improved = False
+            for slot in cinema_day.slots:
+                for movie in cinema_day.movies:
+                    if not self._fits(slot, movie):
+                        continue
+                    for fmt in _formats(movie):
+                        if (movie, fmt) != (slot.movie, slot.format):
+                            improved |= self._try(cinema_day, [(slot, movie, fmt)])
+
+                for other in cinema_day.slots:
+                    if (
+                        other.movie is not slot.movie
+                        and self._fits(slot, other.movie)
+                        and self._fits(other, slot.movie)
+                    ):
+                        improved |= self._try(
+                            cinema_day, [(slot, other.movie, other.format), (other, slot.movie, slot.format)]
+                        )
+            if not improved:
+                break
+
+
+def plan_schedule(dates, halls, movies, gap=CLEANING_MINUTES, min_occupancy=0.0):
+    """
+    Несохранённые сеансы для залов (с hall.cinema) на даты по ожидаемой заполняемости:
+    (сеансы, ожидаемое число зрителей). Фильмы и залы загружаются вызывающим.
+    """
+    capacities = [hall.layout.get("capacity", 0) for hall in halls]
+    model = DemandModel.from_history(dates[0], median(capacities) if capacities else 0)
+    planner = Planner(model, gap=gap, min_occupancy=min_occupancy)
+    timelines = load_timelines(halls, dates[0], dates[-1])
+
+    # Сеансы, которые уже стоят в расписании, тоже делят зрителей с новыми
+    shown = defaultdict(lambda: defaultdict(int))
+    existing = ScheduleEntry.objects.filter(
+        hall_id__in=[hall.pk for hall in halls], date__gte=dates[0], date__lte=dates[-1]
+    ).values_list("cinema_id", "date", "movie_id")
+    for cinema_id, date, movie_id in existing:
+        shown[cinema_id, date][movie_id] += 1
+
+    halls_by_cinema = defaultdict(list)
+    for hall in sorted(halls, key=lambda hall: -hall.layout.get("capacity", 0)):
+        halls_by_cinema[hall.cinema_id].append(hall)
+
+    planned, expected = [], 0
+    for date in dates:
+        running = [movie for movie in movies if movie.start_date <= date <= movie.end_date]
+        for cinema_id, cinema_halls in halls_by_cinema.items():
+            cinema_day = _CinemaDay(date, running, shown[cinema_id, date])
+            for hall in cinema_halls:
+                planner.fill_hall(hall, cinema_day, timelines[hall.pk])
+            planner.repair(cinema_day)
+            expected += cinema_day.total()
+            planned.extend(cinema_day.slots)
+
+    sessions = [
+        Session(
+            movie=slot.movie,
+            hall=slot.hall,
+            start_time=slot.start,
+            end_time=slot.start + model.duration(slot.movie.id),
+            price=PRICES.get(slot.format, PRICES[MovieFormat.TWO_D]),
+            format=slot.format,
+            capacity=slot.capacity,
+        )
+        for slot in sorted(planned, key=lambda slot: (slot.start, slot.hall.pk))
+    ]
+    return sessions, expected
@@ -0,0 +1,209 @@
+"""
+Денормализованное расписание для публичной страницы сеансов.
+
+Каждому сеансу соответствует строка ScheduleEntry с id кинотеатра, зала и фильма, их
+названиями на всех языках, постером, местной датой и форматом. Фильтры расписания читают
+только эту таблицу по составным индексам, без join'ов.
+
+Строки обновляются сигналами (signals.py) при сохранении сеанса, фильма, зала или кинотеатра
+и удаляются каскадом вместе с сеансом. Массовые изменения в обход save() должны вызывать
+sync_sessions сами; rebuild() пересобирает всё расписание (команда rebuild_schedule).
+"""
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import formats, timezone
+from django.utils.dateparse import parse_date
+
+from apps.core.pagination import keyset_page
+
+from .models import ScheduleEntry, Session
+
+PAGE_SIZE = 50
+# Keyset-пагинация публичного расписания; session — первичный ключ строки
+ORDERING = ("start_time", "session")
+
+
+def _translated_fields(target):
+    # Базовую колонку modeltranslation привязывает к активному языку, поэтому пишем только языковые
+    return [f"{target}_{lang}" for lang in settings.MODELTRANSLATION_LANGUAGES]
+
+
+# Поля строки, которые переписываются при повторной синхронизации сеанса
+_UPDATE_FIELDS = [
+    "cinema",
+    "hall",
+    "movie",
+    "date",
+    "start_time",
+    "end_time",
+    "format",
+    "price",
+    "movie_poster",
+    "updated_at",
+    *_translated_fields("movie_name"),
+    *_translated_fields("cinema_name"),
+    *_translated_fields("hall_name"),
+]
+
+
+def _translated(target, source, source_field):
+    """Значения переводимого поля source для всех языков: {<target>_<lang>: ...}"""
+    return {
+        f"{target}_{lang}": getattr(source, f"{source_field}_{lang}") for lang in settings.MODELTRANSLATION_LANGUAGES
+    }
+
+
+def movie_values(movie):
+    return {**_translated("movie_name", movie, "name"), "movie_poster": movie.poster.name or ""}
+
+
+def cinema_values(cinema):
+    return _translated("cinema_name", cinema, "name")
+
+
+def hall_values(hall):
+    return _translated("hall_name", hall, "name")
+
+
+def _entry(session):
+    hall = session.hall
+    return ScheduleEntry(
+        session_id=session.pk,
+        cinema_id=hall.cinema_id,
+        hall_id=hall.pk,
+        movie_id=session.movie_id,
+        date=timezone.localdate(session.start_time),
+        start_time=session.start_time,
+        end_time=session.end_time,
+        format=session.format,
+        price=session.price,
+        updated_at=session.updated_at,
+        **movie_values(session.movie),
+        **cinema_values(hall.cinema),
+        **hall_values(hall),
+    )
+
+
+def sync_sessions(sessions):
+    """Создаёт или обновляет строки расписания для сеансов (с загруженными movie и hall.cinema)"""
+    entries = [_entry(session) for session in sessions]
+    if entries:
+        ScheduleEntry.objects.bulk_create(
+            entries, update_conflicts=True, unique_fields=["session"], update_fields=_UPDATE_FIELDS
+        )
+
+
+def movie_changed(movie):
+    ScheduleEntry.objects.filter(movie=movie).update(**movie_values(movie), updated_at=timezone.now())
+
+
+def cinema_changed(cinema):
+    ScheduleEntry.objects.filter(cinema=cinema).update(**cinema_values(cinema), updated_at=timezone.now())
+
+
+def hall_changed(hall):
+    ScheduleEntry.objects.filter(hall=hall).update(**hall_values(hall), updated_at=timezone.now())
+
+
+def rebuild(batch_size=1000):
+    """Пересобирает расписание целиком; возвращает число строк"""
+    sessions = Session.objects.select_related("movie", "hall__cinema").defer("hall__scheme_data", "hall__layout")
+
+    total = 0
+    batch = []
+    for session in sessions.order_by("pk").iterator(chunk_size=batch_size):
+        batch.append(session)
+        if len(batch) == batch_size:
+            sync_sessions(batch)
+            total += len(batch)
+            batch = []
+    sync_sessions(batch)
+    return total + len(batch)
+
+
+def attach_occupancy(entries):
+    """Подставляет строкам расписания текущие счётчики мест из Session (один запрос по первичному ключу)"""
+    entries = list(entries)
+    counters = Session.objects.filter(pk__in=[entry.session_id for entry in entries]).values_list(
+        "pk", "capacity", "booked_count"
+    )
+    counters = {pk: (capacity, booked) for pk, capacity, booked in counters}
+    for entry in entries:
+        entry.capacity, entry.booked_count = counters.get(entry.session_id, (0, 0))
+    return entries
+
+
+def _ids(values):
+    return [int(value) for value in values if value.isdigit()]
+
+
+def _parse_day(value):
+    try:
+        return parse_date(value) if value else None
+    except ValueError:
+        return None
+
+
+def parse_filters(params):
+    """Фильтры расписания из GET-параметров: format (несколько), cinema, movie, hall, date; некорректные значения игнорируются"""
+    return {
+        "format": params.getlist("format"),
+        "cinema": _ids(params.getlist("cinema")),
+        "movie": _ids(params.getlist("movie")),
+        "hall": _ids(params.getlist("hall")),
+        "date": _parse_day(params.get("date")),
+    }
+
+
+def filter_entries(params):
+    """Строки расписания по GET-параметрам страницы; без даты — только предстоящие сеансы"""
+    filters = parse_filters(params)
+    queryset = ScheduleEntry.objects.all()
+
+    if filters["format"]:
+        queryset = queryset.filter(format__in=filters["format"])
+
+    for field in ("cinema", "movie", "hall"):
+        if filters[field]:
+            queryset = queryset.filter(**{f"{field}_id__in": filters[field]})
+
+    if filters["date"]:
+        queryset = queryset.filter(date=filters["date"])
+    else:
+        queryset = queryset.filter(start_time__gte=timezone.now())
+    return queryset
+
+
+def get_page(params):
+    """Страница расписания после курсора из params: (строки со счётчиками мест, курсор следующей страницы)"""
+    entries, next_cursor = keyset_page(
+        filter_entries(params), ORDERING, cursor=params.get("cursor"), per_page=PAGE_SIZE
+    )
+    return attach_occupancy(entries), next_cursor
+
+
+def entry_json(entry):
+    start_time = timezone.localtime(entry.start_time)
+    return {
+        "id": entry.session_id,
+        "start_time": start_time.isoformat(),
+        "date": entry.date.isoformat(),
+        "date_label": formats.date_format(entry.date, "d E Y (l)"),
+        "time": start_time.strftime("%H:%M"),
+        "format": entry.format,
+        "format_label": entry.get_format_display(),
+        "price": str(entry.price),
+        "movie": {"id": entry.movie_id, "name": entry.movie_name, "poster": entry.movie_poster_url},
+        "cinema": {"id": entry.cinema_id, "name": entry.cinema_name},
+        "hall": {"id": entry.hall_id, "name": entry.hall_name},
+        "capacity": entry.capacity,
+        "seats_left": entry.seats_left,
+        "sold_out": entry.is_sold_out,
+        "urls": {
+            "booking": reverse("cinema:booking", args=[entry.session_id]),
+            "movie": reverse("cinema:movie_detail", args=[entry.movie_id]),
+            "cinema": reverse("cinema:cinema_detail", args=[entry.cinema_id]),
+            "hall": reverse("cinema:hall_detail", args=[entry.hall_id]),
+        },
+    }
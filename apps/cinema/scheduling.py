@@ -0,0 +1,156 @@
+"""
+Генерация расписания сеансов (команды generate_sessions и init_project).
+
+Существующие сеансы нужных дней загружаются одним запросом в занятые интервалы залов,
+пересечения новых сеансов проверяются в памяти по [начало, конец), а созданные сеансы
+записываются bulk_create пачками. bulk_create обходит Session.save() и сигналы, поэтому
+вместимость сеанса, строки расписания (schedule.py), сброс фасетов и пересборка снимков
+выполняются здесь же.
+
+Окончательно пересечения запрещает ограничение session_hall_no_overlap в базе;
+find_overlaps находит уже существующие пересечения (команда validate_schedule).
+"""
+
+import random
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, FilteredRelation, Q
+from django.utils import timezone
+
+from apps.core.dates import day_start
+
+from . import facets, schedule, snapshots
+from .enums import MovieFormat
+from .models import Session
+
+FORMATS = [MovieFormat.TWO_D, MovieFormat.THREE_D, MovieFormat.IMAX]
+TIME_SLOTS = [(10, 0), (12, 30), (15, 0), (17, 30), (20, 0), (22, 30)]
+SESSIONS_PER_HALL = (3, 4)
+DURATION_MINUTES = (90, 180)
+PRICE_RANGE = (80, 120)
+BATCH_SIZE = 500
+
+
+class HallTimeline:
+    """Занятые интервалы одного зала: непересекающиеся [начало, конец), отсортированные по началу"""
+
+    def __init__(self, intervals=()):
+        self._starts = []
+        self._ends = []
+        # Существующие сеансы могут пересекаться между собой — склеиваем их
+        for start, end in sorted(intervals):
+            if self._ends and start < self._ends[-1]:
+                self._ends[-1] = max(self._ends[-1], end)
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+    def is_free(self, start, end):
+        # Интервалы не пересекаются, значит с новым может пересечься только последний
+        # из начавшихся раньше его конца
+        i = bisect_left(self._starts, end)
+        return i == 0 or self._ends[i - 1] <= start
+
+    def busy_until(self, start, end):
+        """Конец занятого интервала, пересекающегося с [start, end), или None, если время свободно"""
+        i = bisect_left(self._starts, end)
+        return self._ends[i - 1] if i and self._ends[i - 1] > start else None
+
+    def next_start(self, after):
+        """Начало первого занятого интервала позже after или None"""
+        i = bisect_right(self._starts, after)
+        return self._starts[i] if i < len(self._starts) else None
+
+    def add(self, start, end):
+        i = bisect_left(self._starts, start)
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
+
+
+def load_timelines(halls, first_day, last_day):
+    """Занятые интервалы залов за дни first_day..last_day (включительно) одним запросом"""
+    window_start = day_start(first_day)
+    window_end = day_start(last_day + timedelta(days=1)) + timedelta(minutes=DURATION_MINUTES[1])
+    intervals = {hall.pk: [] for hall in halls}
+    existing = Session.objects.filter(
+        hall__in=list(intervals), start_time__lt=window_end, end_time__gt=window_start
+    ).values_list("hall_id", "start_time", "end_time")
+    for hall_id, start, end in existing:
+        intervals[hall_id].append((start, end))
+    return {hall_id: HallTimeline(hall_intervals) for hall_id, hall_intervals in intervals.items()}
+
+
+def plan_sessions(dates, halls, movies, rng=random):
+    """
+    Несохранённые сеансы для залов на даты: по одному случайному фильму на зал в день
+    и 3-4 сеанса в случайных слотах, не пересекающихся с уже занятым временем зала.
+    """
+    timelines = load_timelines(halls, dates[0], dates[-1])
+    planned = []
+    for date in dates:
+        for hall in halls:
+            timeline = timelines[hall.pk]
+            movie = rng.choice(movies)
+            wanted = rng.randint(*SESSIONS_PER_HALL)
+            for hour, minute in rng.sample(TIME_SLOTS, len(TIME_SLOTS)):
+                start_time = timezone.make_aware(datetime.combine(date, time(hour, minute)))
+                end_time = start_time + timedelta(minutes=rng.randint(*DURATION_MINUTES))
+                if not timeline.is_free(start_time, end_time):
+                    continue
+
+                timeline.add(start_time, end_time)
+                planned.append(
+                    Session(
+                        movie=movie,
+                        hall=hall,
+                        start_time=start_time,
+                        end_time=end_time,
+                        price=Decimal(rng.randint(*PRICE_RANGE)),
+                        format=rng.choice(FORMATS),
+                        capacity=hall.layout.get("capacity", 0),
+                    )
+                )
+                wanted -= 1
+                if not wanted:
+                    break
+    return planned
+
+
+def create_sessions(sessions, batch_size=BATCH_SIZE):
+    """Сохраняет сеансы пачками вместе со строками расписания"""
+    with transaction.atomic():
+        for i in range(0, len(sessions), batch_size):
+            batch = Session.objects.bulk_create(sessions[i : i + batch_size])
+            schedule.sync_sessions(batch)
+        transaction.on_commit(facets.invalidate)
+        snapshots.schedule_rebuild({session.hall.cinema_id for session in sessions})
+        snapshots.invalidate_movies({session.movie_id for session in sessions})
+    return sessions
+
+
+def find_overlaps(sessions=None):
+    """
+    Пары пересекающихся по времени сеансов одного зала одним запросом:
+    [(hall_id, (id, начало, конец), (id, начало, конец)), ...], первым идёт сеанс с меньшим id.
+    """
+    if sessions is None:
+        sessions = Session.objects.all()
+    pairs = (
+        sessions.annotate(
+            other=FilteredRelation(
+                "hall__session",
+                condition=Q(
+                    hall__session__pk__gt=F("pk"),
+                    hall__session__start_time__lt=F("end_time"),
+                    hall__session__end_time__gt=F("start_time"),
+                ),
+            )
+        )
+        .filter(other__isnull=False)
+        .order_by("hall_id", "start_time", "other__start_time")
+        .values_list("hall_id", "pk", "start_time", "end_time", "other__pk", "other__start_time", "other__end_time")
+    )
+    return [(row[0], row[1:4], row[4:7]) for row in pairs]
@@ -0,0 +1,71 @@
+"""Разбор Hall.scheme_data в список мест зала"""
+
+
+def _scheme_rows(scheme_data):
+    """Строки схемы как списки признаков "место / проход" в обоих поддерживаемых форматах"""
+    if not scheme_data:
+        return []
+
+    # Формат редактора в админке: {"rows": 10, "columns": 15, "scheme": [[0, 1, ...], ...]}
+    if isinstance(scheme_data.get("scheme"), list):
+        return [[cell == 1 for cell in row] for row in scheme_data["scheme"]]
+
+    # Формат со списком рядов: {"rows": [{"seats": [{"type": "seat"}, {"type": "aisle"}, ...]}, ...]}
+    if isinstance(scheme_data.get("rows"), list):
+        return [[seat.get("type") != "aisle" for seat in row.get("seats", [])] for row in scheme_data["rows"]]
+
+    return []
+
+
+def iter_scheme_seats(scheme_data):
+    """
+    Возвращает места схемы в порядке отрисовки как пары (ряд, место).
+
+    Нумерация совпадает с booking.html: при экране снизу ряды считаются с конца,
+    места нумеруются слева направо без учёта проходов.
+    """
+    rows = _scheme_rows(scheme_data)
+    screen_bottom = scheme_data.get("screen_position") == "bottom" if scheme_data else False
+
+    for row_index, cells in enumerate(rows):
+        row_number = len(rows) - row_index if screen_bottom else row_index + 1
+        seat_number = 0
+        for is_seat in cells:
+            if is_seat:
+                seat_number += 1
+                yield row_number, seat_number
+
+
+def compile_layout(scheme_data):
+    """
+    Нормализованная схема зала, не зависящая от формата scheme_data.
+
+    {"screen": "top" | "bottom", "columns": ширина, "capacity": число мест,
+     "rows": [{"label": номер ряда, "cells": [номер места или 0 для прохода, ...]}, ...]}
+
+    Ряды идут в порядке отрисовки (сверху вниз), места в cells — в порядке битов
+    карты занятости (см. iter_scheme_seats).
+    """
+    rows = _scheme_rows(scheme_data)
+    screen_bottom = scheme_data.get("screen_position") == "bottom" if scheme_data else False
+
+    compiled_rows = []
+    capacity = 0
+    for row_index, cells in enumerate(rows):
+        seat_number = 0
+        compiled_cells = []
+        for is_seat in cells:
+            if is_seat:
+                seat_number += 1
+            compiled_cells.append(seat_number if is_seat else 0)
+        capacity += seat_number
+        compiled_rows.append(
+            {"label": len(rows) - row_index if screen_bottom else row_index + 1, "cells": compiled_cells}
+        )
+
+    return {
+        "screen": "bottom" if screen_bottom else "top",
+        "columns": max((len(cells) for cells in rows), default=0),
+        "capacity": capacity,
+        "rows": compiled_rows,
+    }
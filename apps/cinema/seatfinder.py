@@ -0,0 +1,70 @@
+"""
+Подбор лучших соседних мест для компании.
+
+По скомпилированной схеме зала и занятым местам сеанса строится индекс свободных
+интервалов: для каждого ряда — отрезки подряд идущих свободных мест без проходов.
+Из каждого отрезка, вмещающего компанию, берётся блок, ближайший к центру ряда,
+и блоки сравниваются по удалённости от центра зала по горизонтали и от лучшей
+глубины ряда относительно экрана. Работа линейна по числу мест зала.
+"""
+
+# Самая большая компания, для которой подбираются места
+MAX_PARTY_SIZE = 10
+
+# Лучшая глубина ряда как доля расстояния от экрана до последнего ряда
+IDEAL_DEPTH = 0.6
+
+
+def free_intervals(layout, occupied):
+    """
+    Индекс свободных интервалов: список (индекс ряда в порядке отрисовки, номер ряда,
+    колонка первого места, номера мест отрезка) для всех отрезков свободных соседних мест.
+    """
+    intervals = []
+    for row_index, row in enumerate(layout.data.get("rows", [])):
+        start, numbers = None, []
+        for column, number in enumerate([*row["cells"], 0]):
+            if number and (row["label"], number) not in occupied:
+                if not numbers:
+                    start = column
+                numbers.append(number)
+            elif numbers:
+                intervals.append((row_index, row["label"], start, numbers))
+                numbers = []
+    return intervals
+
+
+def find_best_seats(layout, occupied, count):
+    """
+    Лучший блок из count соседних свободных мест как список пар (ряд, место) или None.
+
+    occupied — множество занятых мест (пары (ряд, место)).
+    """
+    rows = layout.data.get("rows", [])
+    if count < 1 or not rows:
+        return None
+
+    center_column = (layout.data.get("columns", 0) - 1) / 2
+    width = max(layout.data.get("columns", 0) - 1, 1)
+    depth = max(len(rows) - 1, 1)
+    ideal_depth = IDEAL_DEPTH * (len(rows) - 1)
+    screen_bottom = layout.data.get("screen") == "bottom"
+
+    best, best_score = None, None
+    for row_index, label, start, numbers in free_intervals(layout, occupied):
+        if len(numbers) < count:
+            continue
+
+        # Блок отрезка, центр которого ближе всего к центру зала
+        offset = round(center_column - (count - 1) / 2) - start
+        offset = min(max(offset, 0), len(numbers) - count)
+
+        distance = len(rows) - 1 - row_index if screen_bottom else row_index
+        score = abs(start + offset + (count - 1) / 2 - center_column) / width + abs(distance - ideal_depth) / depth
+        if best_score is None or score < best_score:
+            best, best_score = (label, numbers[offset : offset + count]), score
+
+    if best is None:
+        return None
+    label, block = best
+    return [(label, number) for number in block]
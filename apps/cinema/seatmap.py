@@ -0,0 +1,237 @@
+"""
+Битовая карта занятых мест сеанса.
+
+Один бит на место в порядке скомпилированной схемы зала (см. layout.HallLayout.positions). Карта хранится
+в Redis (или в памяти процесса, если Redis не настроен) и обновляется точечно при
+создании и снятии брони, поэтому страница бронирования читает занятость
+одним обращением к кэшу. При промахе карта собирается из инвентаря мест сеанса.
+
+Время жизни карты не превышает срок ближайшей истекающей брони: после него карта
+пересобирается из БД, и просроченные брони освобождаются без отдельной записи.
+Счётчик поколений защищает от записи устаревшей карты, собранной параллельно с изменением,
+и служит версией карты для клиентов (ETag). Поколение меняется при каждом изменении и при
+каждой пересборке и никогда не уменьшается: новое значение не меньше текущего времени в мс,
+поэтому версия растёт и после того, как ключ счётчика истёк или Redis был очищен.
+"""
+
+import threading
+import time
+from functools import cache
+
+from django.conf import settings
+from django.utils import timezone
+
+from apps.core.redis_client import get_redis
+
+from .enums import SeatState
+from .layout import get_layout
+
+# KEYS: карта, счётчик поколений
+# ARGV: значение бита, TTL брони (мс), максимальный TTL (мс), текущее время (мс), индексы...
+_SET_BITS_SCRIPT = """
+local generation = math.max(tonumber(redis.call("GET", KEYS[2]) or "0") + 1, tonumber(ARGV[4]))
+redis.call("SET", KEYS[2], generation, "PX", ARGV[3])
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return 0
+end
+for i = 5, #ARGV do
+    redis.call("SETBIT", KEYS[1], ARGV[i], ARGV[1])
+end
+local ttl = tonumber(ARGV[2])
+if ttl > 0 and ttl < redis.call("PTTL", KEYS[1]) then
+    redis.call("PEXPIRE", KEYS[1], ttl)
+end
+return 1
+"""
+
+# KEYS: карта, счётчик поколений
+# ARGV: ожидаемое поколение, карта, TTL (мс), максимальный TTL (мс), текущее время (мс)
+_STORE_SCRIPT = """
+if (redis.call("GET", KEYS[2]) or "0") ~= ARGV[1] then
+    return 0
+end
+local generation = math.max(tonumber(ARGV[1]) + 1, tonumber(ARGV[5]))
+redis.call("SET", KEYS[2], generation, "PX", ARGV[4])
+redis.call("SET", KEYS[1], ARGV[2], "PX", ARGV[3])
+return generation
+"""
+
+
+def _map_key(session_id):
+    return f"seatmap:{session_id}"
+
+
+def _generation_key(session_id):
+    return f"seatmap:{session_id}:gen"
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _next_generation(generation):
+    return max(generation + 1, _now_ms())
+
+
+class RedisSeatMapStore:
+    def __init__(self, client):
+        self.client = client
+        self._set_bits = client.register_script(_SET_BITS_SCRIPT)
+        self._store = client.register_script(_STORE_SCRIPT)
+
+    def read(self, session_id):
+        """Возвращает (карта или None, текущее поколение) одним запросом"""
+        bitmap, generation = self.client.mget(_map_key(session_id), _generation_key(session_id))
+        return bitmap, int(generation or 0)
+
+    def store(self, session_id, bitmap, generation, ttl_ms):
+        """Сохраняет карту, если поколение не изменилось; возвращает новое поколение или 0"""
+        keys = [_map_key(session_id), _generation_key(session_id)]
+        max_ttl_ms = settings.SEAT_MAP_CACHE_TTL * 1000
+        return int(self._store(keys=keys, args=[generation, bitmap, ttl_ms, max_ttl_ms, _now_ms()]))
+
+    def set_bits(self, session_id, indexes, value, ttl_ms=0):
+        keys = [_map_key(session_id), _generation_key(session_id)]
+        max_ttl_ms = settings.SEAT_MAP_CACHE_TTL * 1000
+        self._set_bits(keys=keys, args=[int(value), ttl_ms, max_ttl_ms, _now_ms(), *indexes])
+
+    def forget(self, session_ids):
+        keys = [_map_key(session_id) for session_id in session_ids]
+        if keys:
+            self.client.delete(*keys)
+
+
+class LocalSeatMapStore:
+    """Замена Redis в памяти процесса с той же семантикой (тесты и локальная разработка)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._maps = {}
+        self._generations = {}
+
+    def _alive(self, session_id):
+        entry = self._maps.get(session_id)
+        if entry and entry[1] <= time.monotonic():
+            del self._maps[session_id]
+            return None
+        return entry
+
+    def read(self, session_id):
+        with self._lock:
+            entry = self._alive(session_id)
+            return (bytes(entry[0]) if entry else None), self._generations.get(session_id, 0)
+
+    def store(self, session_id, bitmap, generation, ttl_ms):
+        with self._lock:
+            if self._generations.get(session_id, 0) != generation:
+                return 0
+            self._generations[session_id] = _next_generation(generation)
+            self._maps[session_id] = [bytearray(bitmap), time.monotonic() + ttl_ms / 1000]
+            return self._generations[session_id]
+
+    def set_bits(self, session_id, indexes, value, ttl_ms=0):
+        with self._lock:
+            self._generations[session_id] = _next_generation(self._generations.get(session_id, 0))
+            entry = self._alive(session_id)
+            if not entry:
+                return
+            bitmap = entry[0]
+            for index in indexes:
+                byte, mask = index // 8, 0x80 >> (index % 8)
+                if byte >= len(bitmap):
+                    bitmap.extend(bytes(byte - len(bitmap) + 1))
+                if value:
+                    bitmap[byte] |= mask
+                else:
+                    bitmap[byte] &= ~mask
+            if ttl_ms > 0:
+                entry[1] = min(entry[1], time.monotonic() + ttl_ms / 1000)
+
+    def forget(self, session_ids):
+        with self._lock:
+            for session_id in session_ids:
+                self._maps.pop(session_id, None)
+
+
+_local_store = LocalSeatMapStore()
+
+
+@cache
+def get_store():
+    client = get_redis()
+    return RedisSeatMapStore(client) if client else _local_store
+
+
+def seat_positions(hall):
+    """Места зала в порядке битов карты"""
+    return get_layout(hall).positions
+
+
+def _is_set(bitmap, index):
+    byte = index // 8
+    return byte < len(bitmap) and bool(bitmap[byte] & (0x80 >> (index % 8)))
+
+
+def build_bitmap(session, positions):
+    """Собирает карту из инвентаря мест; возвращает (карта, TTL в мс)"""
+    from .services import active_seat_states
+
+    index = {position: i for i, position in enumerate(positions)}
+    bitmap = bytearray((len(positions) + 7) // 8)
+    ttl_ms = settings.SEAT_MAP_CACHE_TTL * 1000
+    now = timezone.now()
+
+    for row, number, state, held_until in active_seat_states(session).values_list(
+        "seat__row", "seat__number", "state", "held_until"
+    ):
+        i = index.get((row, number))
+        if i is not None:
+            bitmap[i // 8] |= 0x80 >> (i % 8)
+        if state == SeatState.HELD:
+            ttl_ms = min(ttl_ms, int((held_until - now).total_seconds() * 1000))
+
+    return bytes(bitmap), max(ttl_ms, 1)
+
+
+def get_versioned_booked_seats(session):
+    """
+    Занятые места сеанса как пары (ряд, место) и версия карты.
+
+    Чтение из кэша, при промахе — сборка из БД. Версия None означает, что карту
+    параллельно изменили во время сборки и результат нельзя считать снимком версии.
+    """
+    positions = seat_positions(session.hall)
+    store = get_store()
+
+    bitmap, generation = store.read(session.pk)
+    if bitmap is None:
+        bitmap, ttl_ms = build_bitmap(session, positions)
+        generation = store.store(session.pk, bitmap, generation, ttl_ms) or None
+
+    return [position for i, position in enumerate(positions) if _is_set(bitmap, i)], generation
+
+
+def get_booked_seats(session):
+    """Занятые места сеанса как пары (ряд, место)"""
+    return get_versioned_booked_seats(session)[0]
+
+
+def mark_seats(session, seats, booked, held_until=None):
+    """
+    Точечно обновляет биты мест сеанса. Вызывается после коммита транзакции.
+
+    seats — пары (ряд, место); held_until — срок брони, до которого карта должна истечь.
+    """
+    index = get_layout(session.hall).index
+    indexes = [index[seat] for seat in seats if seat in index]
+
+    ttl_ms = 0
+    if booked and held_until:
+        ttl_ms = max(int((held_until - timezone.now()).total_seconds() * 1000), 1)
+
+    get_store().set_bits(session.pk, indexes, booked, ttl_ms)
+
+
+def forget_sessions(session_ids):
+    """Сбрасывает карты сеансов (например, после изменения схемы зала)"""
+    get_store().forget(list(session_ids))
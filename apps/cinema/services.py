@@ -0,0 +1,226 @@
+"""Места залов и сеансов: синхронизация со схемой, занятость, захват и освобождение мест"""
+
+from datetime import timedelta
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.utils import timezone
+
+from . import events, holds, seatmap
+from .enums import SeatState
+from .models import Booking, Hall, Seat, Session, SessionSeat
+from .scheme import iter_scheme_seats
+
+# Сервисный сбор за каждое место, грн
+BOOKING_FEE = 3
+
+# Сколько держится неоплаченная бронь
+BOOKING_HOLD_TIME = timedelta(minutes=30)
+
+
+class SeatsUnavailableError(Exception):
+    """Часть выбранных мест уже занята другим покупателем"""
+
+
+def sync_hall_seats(hall):
+    """
+    Приводит строки Seat зала в соответствие со схемой, применяя только разницу.
+
+    Недостающие места создаются одним bulk_create, лишние удаляются одним DELETE.
+    Места, которые уже попадали в брони, не удаляются, а помечаются недоступными,
+    чтобы не потерять историю продаж; при возврате в схему они снова становятся доступны.
+    """
+    wanted = set(iter_scheme_seats(hall.scheme_data))
+    existing = {
+        (row, number): (pk, is_available)
+        for pk, row, number, is_available in Seat.objects.filter(hall=hall).values_list(
+            "pk", "row", "number", "is_available"
+        )
+    }
+
+    Seat.objects.bulk_create(
+        [Seat(hall=hall, row=row, number=number) for row, number in wanted - existing.keys()],
+        ignore_conflicts=True,
+    )
+
+    restored = [pk for position, (pk, is_available) in existing.items() if position in wanted and not is_available]
+    if restored:
+        Seat.objects.filter(pk__in=restored).update(is_available=True)
+
+    removed = {pk for position, (pk, _) in existing.items() if position not in wanted}
+    if removed:
+        booked = set(Booking.seats.through.objects.filter(seat_id__in=removed).values_list("seat_id", flat=True))
+        Seat.objects.filter(pk__in=removed - booked).delete()
+        Seat.objects.filter(pk__in=booked, is_available=True).update(is_available=False)
+
+
+def resolve_seats(hall, positions):
+    """
+    Места зала по парам (ряд, место) одним запросом.
+
+    Возвращает None, если хотя бы одного места нет в текущей схеме зала.
+    """
+    positions = set(positions)
+    seats = [
+        seat
+        for seat in Seat.objects.filter(
+            hall=hall,
+            row__in={row for row, _ in positions},
+            number__in={number for _, number in positions},
+            is_available=True,
+        )
+        if (seat.row, seat.number) in positions
+    ]
+    return seats if len(seats) == len(positions) else None
+
+
+def active_seat_states(session):
+    """Проданные места и места с неистёкшей бронью на сеансе"""
+    return SessionSeat.objects.filter(session=session).filter(
+        Q(state=SeatState.SOLD) | Q(state=SeatState.HELD, held_until__gte=timezone.now())
+    )
+
+
+def get_booked_seat_ids(session):
+    """Список занятых мест в формате "ряд-место" (например "1-5") из битовой карты сеанса"""
+    return [f"{row}-{number}" for row, number in seatmap.get_booked_seats(session)]
+
+
+def get_occupied_seat_ids(session, user_id=None):
+    """Занятые места плюс места, которые сейчас удерживают другие покупатели"""
+    booked_seats = get_booked_seat_ids(session)
+    held_seats = {f"{row}-{number}" for row, number in holds.held_seats(session.pk, exclude_user_id=user_id)}
+    return booked_seats + sorted(held_seats.difference(booked_seats))
+
+
+def _seats_changed(session, positions, occupied, held_until=None):
+    """Обновляет битовую карту и оповещает подписчиков сеанса. Вызывается после коммита."""
+    seatmap.mark_seats(session, positions, occupied, held_until)
+    events.publish(session.pk, positions, occupied)
+
+
+def claim_seats(session, seats, booking):
+    """
+    Закрепляет места сеанса за бронированием.
+
+    Недостающие строки инвентаря вставляются одним INSERT ... ON CONFLICT DO NOTHING,
+    затем условные UPDATE переводят только свободные (или с истёкшей бронью) места
+    в нужное состояние. Если обновилось меньше строк, чем мест, значит другой покупатель
+    успел раньше — бросаем SeatsUnavailableError, и внешний atomic откатывает изменения.
+
+    Счётчик занятых мест сеанса растёт на число ранее свободных мест: места с истёкшей
+    бронью в нём уже учтены и лишь переходят к новой брони.
+    """
+    seat_ids = {seat.pk for seat in seats}
+
+    SessionSeat.objects.bulk_create(
+        [SessionSeat(session=session, seat_id=seat_id) for seat_id in seat_ids],
+        ignore_conflicts=True,
+    )
+
+    if booking.is_paid:
+        state, held_until = SeatState.SOLD, None
+    else:
+        state, held_until = SeatState.HELD, booking.expires_at
+
+    seat_states = SessionSeat.objects.filter(session=session, seat_id__in=seat_ids)
+    claimed = seat_states.filter(state=SeatState.FREE).update(state=state, booking=booking, held_until=held_until)
+    taken_over = seat_states.filter(state=SeatState.HELD, held_until__lt=timezone.now()).update(
+        state=state, booking=booking, held_until=held_until
+    )
+
+    if claimed + taken_over != len(seat_ids):
+        raise SeatsUnavailableError
+
+    if claimed:
+        Session.objects.filter(pk=session.pk).update(booked_count=F("booked_count") + claimed)
+
+    positions = [(seat.row, seat.number) for seat in seats]
+    transaction.on_commit(partial(_seats_changed, session, positions, True, held_until))
+
+
+def create_booking(user, session, seats, is_paid):
+    """
+    Создаёт бронь (или покупку) на места сеанса за постоянное число запросов.
+
+    Сумма считается по известному списку мест, места закрепляются через claim_seats,
+    связи с местами вставляются одним bulk_create в промежуточную таблицу. Вызывать
+    внутри transaction.atomic: при конфликте мест бросается SeatsUnavailableError.
+    """
+    booking = Booking.objects.create(
+        user=user,
+        session=session,
+        ticket_price=session.price,
+        total_amount=(session.price + BOOKING_FEE) * len(seats),
+        is_paid=is_paid,
+        expires_at=None if is_paid else timezone.now() + BOOKING_HOLD_TIME,
+    )
+
+    claim_seats(session, seats, booking)
+
+    BookingSeat = Booking.seats.through
+    BookingSeat.objects.bulk_create([BookingSeat(booking_id=booking.pk, seat_id=seat.pk) for seat in seats])
+
+    return booking
+
+
+def release_bookings(booking_ids):
+    """
+    Удаляет неоплаченные брони (истечение или отмена) и освобождает их места.
+
+    Строки инвентаря одним UPDATE возвращаются в FREE и остаются для следующих броней,
+    биты карты снимаются после коммита. Возвращает количество удалённых броней.
+    """
+    bookings = Booking.objects.filter(pk__in=booking_ids, is_paid=False)
+    seat_states = SessionSeat.objects.filter(booking__in=bookings)
+
+    released = {}
+    for session_id, row, number in seat_states.values_list("session_id", "seat__row", "seat__number"):
+        released.setdefault(session_id, []).append((row, number))
+
+    seat_states.update(state=SeatState.FREE, booking=None, held_until=None)
+    _, deleted = bookings.delete()
+
+    sessions = Session.objects.select_related("hall").in_bulk(released)
+    for session_id, positions in released.items():
+        Session.objects.filter(pk=session_id).update(booked_count=Greatest(F("booked_count") - len(positions), 0))
+        transaction.on_commit(partial(_seats_changed, sessions[session_id], positions, False))
+
+    return deleted.get(Booking._meta.label, 0)
+
+
+def reconcile_session_counters(sessions=None):
+    """
+    Пересчитывает вместимость и занятость сеансов одним UPDATE по подзапросам.
+
+    Обновляются только расходящиеся сеансы; возвращает их количество.
+    """
+    if sessions is None:
+        sessions = Session.objects.all()
+
+    actual_booked = Coalesce(
+        Subquery(
+            SessionSeat.objects.filter(session=OuterRef("pk"))
+            .exclude(state=SeatState.FREE)
+            .values("session")
+            .annotate(n=Count("pk"))
+            .values("n")
+        ),
+        0,
+    )
+    actual_capacity = Coalesce(
+        Subquery(
+            Hall.objects.filter(pk=OuterRef("hall_id"))
+            .annotate(layout_capacity=Cast(KT("layout__capacity"), output_field=IntegerField()))
+            .values("layout_capacity")
+        ),
+        0,
+    )
+
+    stale = sessions.alias(actual_booked=actual_booked, actual_capacity=actual_capacity).exclude(
+        booked_count=F("actual_booked"), capacity=F("actual_capacity")
+    )
+    return stale.update(booked_count=actual_booked, capacity=actual_capacity)
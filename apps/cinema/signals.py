@@ -0,0 +1,75 @@
+"""
+Поддержка денормализованного расписания (schedule.py), кэша фасетов (facets.py),
+снимков расписания кинотеатров и фильмов (snapshots.py) и кэша очереди на бронирование
+(admission.py) при изменении сеансов и справочников
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.core.dates import day_start
+
+from . import admission, facets, schedule, snapshots
+from .models import Cinema, Hall, Movie, ScheduleEntry, Session
+
+
+def _shown_movies(**filters):
+    return ScheduleEntry.objects.filter(**filters).values_list("movie_id", flat=True).distinct()
+
+
+@receiver(post_save, sender=Session)
+def session_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # Сеанс мог сменить фильм — сбрасываем снимок и прежнего фильма из строки расписания
+        snapshots.invalidate_movies([instance.movie_id, *_shown_movies(session=instance)])
+        admission.invalidate_sessions([instance.pk])
+        schedule.sync_sessions([instance])
+        transaction.on_commit(facets.invalidate)
+        snapshots.schedule_rebuild([instance.hall.cinema_id])
+
+
+@receiver(post_delete, sender=Session)
+def session_deleted(sender, instance, **kwargs):
+    # Фасеты и снимки начинаются с сегодняшнего дня: уборка прошедших сеансов их не меняет
+    if instance.start_time < day_start(timezone.localdate()):
+        return
+
+    transaction.on_commit(facets.invalidate)
+    snapshots.invalidate_movies([instance.movie_id])
+    admission.invalidate_sessions([instance.pk])
+    # Зал может удаляться вместе с сеансом — кинотеатр берём, только если зал ещё есть
+    cinema_id = Hall.objects.filter(pk=instance.hall_id).values_list("cinema_id", flat=True).first()
+    if cinema_id is not None:
+        snapshots.schedule_rebuild([cinema_id])
+
+
+@receiver(post_save, sender=Movie)
+def movie_saved(sender, instance, created=False, raw=False, **kwargs):
+    if not (raw or created):
+        schedule.movie_changed(instance)
+        transaction.on_commit(facets.invalidate)
+        snapshots.invalidate_movies([instance.pk])
+        admission.invalidate_sessions(
+            Session.objects.filter(movie=instance, end_time__gt=timezone.now()).values_list("pk", flat=True)
+        )
+        snapshots.schedule_rebuild()
+
+
+@receiver(post_save, sender=Cinema)
+def cinema_saved(sender, instance, created=False, raw=False, **kwargs):
+    if not (raw or created):
+        schedule.cinema_changed(instance)
+        transaction.on_commit(facets.invalidate)
+        snapshots.invalidate_movies(_shown_movies(cinema=instance))
+        snapshots.schedule_rebuild([instance.pk])
+
+
+@receiver(post_save, sender=Hall)
+def hall_saved(sender, instance, created=False, raw=False, **kwargs):
+    if not (raw or created):
+        schedule.hall_changed(instance)
+        transaction.on_commit(facets.invalidate)
+        snapshots.invalidate_movies(_shown_movies(hall=instance))
+        snapshots.schedule_rebuild([instance.cinema_id])
@@ -0,0 +1,139 @@
+"""
+Снимки расписания кинотеатров для страниц кинотеатра и зала.
+
+Снимок — строки расписания (ScheduleEntry) одного кинотеатра на SCHEDULE_SNAPSHOT_DAYS
+дней вперёд, разложенные по дням, в кэше Django. Страницы берут из снимка сеансы нужного
+дня (зал — свою часть снимка кинотеатра) без запросов к расписанию; снимок на несколько
+дней остаётся верным и после полуночи, пока его не пересоберут.
+
+После изменения сеансов кинотеатра (schedule_rebuild) его снимок удаляется при коммите,
+а Celery-задача tasks.rebuild_schedule_snapshots собирает новый заранее; ещё она
+пересобирает все снимки каждую ночь. Если снимка нет, страница собирает его сама.
+
+Для страницы фильма так же хранятся его сеансы на SCHEDULE_MOVIE_DAYS дней начиная с
+сегодняшнего. Их не пересобирают заранее: изменения сеансов фильма и названий залов и
+кинотеатров удаляют снимок (invalidate_movies), а страница собирает новый одним запросом.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core.dates import day_range
+
+from .models import Cinema, ScheduleEntry
+from .schedule import attach_occupancy
+
+# Переводимые названия берутся по колонкам языков: базовую modeltranslation подменяет
+_FIELDS = [
+    field.attname
+    for field in ScheduleEntry._meta.concrete_fields
+    if field.attname not in ("movie_name", "cinema_name", "hall_name")
+]
+
+
+def _key(cinema_id):
+    return f"schedule:snapshot:cinema:{cinema_id}"
+
+
+def _pending_key(cinema_id):
+    return f"schedule:snapshot:pending:{cinema_id}"
+
+
+def _movie_key(movie_id):
+    return f"schedule:snapshot:movie:{movie_id}"
+
+
+def build(cinema_id):
+    """Собирает и сохраняет снимок расписания кинотеатра: {день: [поля строк расписания]}"""
+    first_day = timezone.localdate()
+    start, end = day_range(first_day, settings.SCHEDULE_SNAPSHOT_DAYS)
+    rows = ScheduleEntry.objects.filter(cinema_id=cinema_id, start_time__gte=start, start_time__lt=end).order_by(
+        "start_time"
+    )
+
+    days = {first_day + timedelta(days=i): [] for i in range(settings.SCHEDULE_SNAPSHOT_DAYS)}
+    for row in rows.values(*_FIELDS):
+        days.setdefault(row["date"], []).append(row)
+    cache.set(_key(cinema_id), days, settings.SCHEDULE_SNAPSHOT_TTL)
+    return days
+
+
+def rebuild(cinema_ids=None):
+    """Пересобирает снимки кинотеатров (всех, если cinema_ids не задан); возвращает их число"""
+    if cinema_ids is None:
+        cinema_ids = list(Cinema.objects.values_list("pk", flat=True))
+    for cinema_id in cinema_ids:
+        # Снимаем отметку до сборки: изменение во время сборки запланирует ещё одну
+        cache.delete(_pending_key(cinema_id))
+        build(cinema_id)
+    return len(cinema_ids)
+
+
+def invalidate(cinema_ids=None):
+    """Удаляет снимки кинотеатров (всех, если cinema_ids не задан)"""
+    if cinema_ids is None:
+        cinema_ids = Cinema.objects.values_list("pk", flat=True)
+    cache.delete_many([_key(pk) for pk in cinema_ids])
+
+
+def schedule_rebuild(cinema_ids=None):
+    """
+    После коммита удаляет снимки кинотеатров (страницы больше не видят старые сеансы) и
+    ставит их пересборку в очередь Celery, чтобы снимок был готов до следующих запросов.
+    Кинотеатр, пересборка которого уже ждёт в очереди, повторно в неё не ставится.
+    """
+    from .tasks import rebuild_schedule_snapshots
+
+    changed = None if cinema_ids is None else set(cinema_ids)
+    transaction.on_commit(lambda: invalidate(changed))
+
+    pending = changed
+    if changed is not None:
+        pending = [pk for pk in changed if cache.add(_pending_key(pk), 1, settings.SCHEDULE_SNAPSHOT_DEBOUNCE)]
+        if not pending:
+            return
+    transaction.on_commit(lambda: rebuild_schedule_snapshots.delay(pending))
+
+
+def sessions_on(cinema_id, day, hall_id=None):
+    """Сеансы кинотеатра (или одного зала) за день из снимка, с текущими счётчиками мест"""
+    days = cache.get(_key(cinema_id))
+    if days is None or day not in days:
+        days = build(cinema_id)
+
+    rows = days.get(day, [])
+    if hall_id is not None:
+        rows = [row for row in rows if row["hall_id"] == hall_id]
+    return attach_occupancy(ScheduleEntry(**row) for row in rows)
+
+
+def build_movie(movie_id):
+    """Собирает и сохраняет снимок сеансов фильма: {"day": первый день, "rows": [поля строк расписания]}"""
+    first_day = timezone.localdate()
+    start, end = day_range(first_day, settings.SCHEDULE_MOVIE_DAYS)
+    rows = ScheduleEntry.objects.filter(movie_id=movie_id, start_time__gte=start, start_time__lt=end).order_by(
+        "start_time", "session"
+    )
+    snapshot = {"day": first_day, "rows": list(rows.values(*_FIELDS))}
+    cache.set(_movie_key(movie_id), snapshot, settings.SCHEDULE_SNAPSHOT_TTL)
+    return snapshot
+
+
+def invalidate_movies(movie_ids):
+    """Удаляет снимки фильмов после коммита"""
+    keys = [_movie_key(pk) for pk in set(movie_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def movie_sessions(movie_id):
+    """Сеансы фильма на SCHEDULE_MOVIE_DAYS дней начиная с сегодняшнего из снимка (строки расписания)"""
+    snapshot = cache.get(_movie_key(movie_id))
+    # Вчерашний снимок начинается не с того дня
+    if snapshot is None or snapshot["day"] != timezone.localdate():
+        snapshot = build_movie(movie_id)
+    return [ScheduleEntry(**row) for row in snapshot["rows"]]
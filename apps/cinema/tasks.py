@@ -0,0 +1,47 @@
+"""Celery tasks для бронирований и расписания"""
+
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.cinema import snapshots
+from apps.cinema.models import Booking
+from apps.cinema.services import release_bookings
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def reap_expired_bookings():
+    """Удаляет истёкшие неоплаченные брони пачками, каждая пачка — отдельная транзакция"""
+    batch_size = settings.BOOKING_REAPER_BATCH_SIZE
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            # skip_locked: брони, которые прямо сейчас оплачивают, разберём в следующий раз
+            booking_ids = list(
+                Booking.objects.select_for_update(skip_locked=True)
+                .filter(is_paid=False, expires_at__lt=timezone.now())
+                .order_by("expires_at")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not booking_ids:
+                break
+            total += release_bookings(booking_ids)
+
+        if len(booking_ids) < batch_size:
+            break
+
+    if total:
+        logger.info(f"Удалено истёкших броней: {total}")
+    return {"deleted": total}
+
+
+@shared_task
+def rebuild_schedule_snapshots(cinema_ids=None):
+    """Пересобирает снимки расписания кинотеатров (всех — по ночному расписанию)"""
+    return {"rebuilt": snapshots.rebuild(cinema_ids)}
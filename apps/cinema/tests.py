@@ -1 +1,489 @@
-# Create your tests here.
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+from random import Random
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.core.dates import day_start, in_days
+
+from . import admission, holds, idempotency
+from .enums import MovieFormat, SeatState
+from .models import Booking, Cinema, Hall, Movie, Seat, Session, SessionSeat
+from .planner import plan_schedule
+from .scheduling import HallTimeline, plan_sessions
+from .services import SeatsUnavailableError, create_booking, release_bookings, sync_hall_seats
+
+
+def create_session(rows=5, columns=8):
+    """Сеанс через два часа в зале rows x columns со всеми местами"""
+    cinema = Cinema.objects.create(name="Test cinema", description="-", conditions="-")
+    hall = Hall.objects.create(
+        cinema=cinema,
+        name="Test hall",
+        description="-",
+        scheme_data={
+            "rows": rows,
+            "columns": columns,
+            "screen_position": "top",
+            "scheme": [[1] * columns for _ in range(rows)],
+        },
+    )
+    sync_hall_seats(hall)
+
+    today = timezone.localdate()
+    movie = Movie.objects.create(
+        name="Test movie",
+        description="-",
+        trailer_url="https://example.com",
+        start_date=today,
+        end_date=today + timedelta(days=7),
+    )
+    start_time = timezone.now() + timedelta(hours=2)
+    return Session.objects.create(
+        movie=movie, hall=hall, start_time=start_time, end_time=start_time + timedelta(hours=2), price=Decimal(100)
+    )
+
+
+class CreateBookingQueriesTest(TestCase):
+    """Число запросов на создание брони не зависит от числа мест"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.session = create_session()
+        cls.user = get_user_model().objects.create_user(
+            email="buyer@example.com", first_name="Test", last_name="Buyer", password="password"
+        )
+        cls.seats = list(Seat.objects.filter(hall=cls.session.hall).order_by("row", "number"))
+
+    def book(self, count):
+        # Каждая бронь откатывается, чтобы места были свободны для следующей
+        with transaction.atomic():
+            create_booking(self.user, self.session, self.seats[:count], is_paid=False)
+            transaction.set_rollback(True)
+
+    def test_query_count_does_not_depend_on_seat_count(self):
+        with CaptureQueriesContext(connection) as single:
+            self.book(1)
+
+        for count in (2, 8, len(self.seats)):
+            with self.subTest(seats=count), self.assertNumQueries(len(single)):
+                self.book(count)
+
+
+class ClaimSeatsTest(TransactionTestCase):
+    """Одно место не продаётся дважды: конфликт откатывает бронь целиком"""
+
+    def setUp(self):
+        self.session = create_session()
+        self.seats = list(Seat.objects.filter(hall=self.session.hall).order_by("row", "number"))
+        User = get_user_model()
+        self.first = User.objects.create_user(email="first@example.com", first_name="A", last_name="A", password="x")
+        self.second = User.objects.create_user(email="second@example.com", first_name="B", last_name="B", password="x")
+
+    def book(self, user, seats, is_paid=False):
+        with transaction.atomic():
+            return create_booking(user, self.session, seats, is_paid=is_paid)
+
+    def seat_state(self, seat):
+        return SessionSeat.objects.get(session=self.session, seat=seat)
+
+    def booked_count(self):
+        self.session.refresh_from_db(fields=["booked_count"])
+        return self.session.booked_count
+
+    def test_taken_seat_is_not_claimed_twice(self):
+        booking = self.book(self.first, self.seats[:2], is_paid=True)
+
+        with self.assertRaises(SeatsUnavailableError):
+            self.book(self.second, self.seats[1:3])
+
+        self.assertEqual(list(Booking.objects.values_list("pk", flat=True)), [booking.pk])
+        self.assertEqual(self.seat_state(self.seats[1]).booking_id, booking.pk)
+        self.assertFalse(SessionSeat.objects.filter(seat=self.seats[2]).exclude(state=SeatState.FREE).exists())
+        self.assertEqual(self.booked_count(), 2)
+
+    def test_expired_hold_is_claimed_again(self):
+        expired = self.book(self.first, self.seats[:1])
+        SessionSeat.objects.filter(booking=expired).update(held_until=timezone.now() - timedelta(minutes=1))
+
+        booking = self.book(self.second, self.seats[:1], is_paid=True)
+
+        state = self.seat_state(self.seats[0])
+        self.assertEqual((state.booking_id, state.state, state.held_until), (booking.pk, SeatState.SOLD, None))
+        # Место с истёкшей бронью уже было учтено в счётчике
+        self.assertEqual(self.booked_count(), 1)
+
+    def test_release_frees_seats(self):
+        booking = self.book(self.first, self.seats[:2])
+
+        with transaction.atomic():
+            self.assertEqual(release_bookings([booking.pk]), 1)
+
+        states = SessionSeat.objects.filter(seat__in=self.seats[:2])
+        self.assertEqual(set(states.values_list("state", "booking", "held_until")), {(SeatState.FREE, None, None)})
+        self.assertEqual(self.booked_count(), 0)
+        self.book(self.second, self.seats[:2])
+
+
+@override_settings(SEAT_HOLD_TTL=60)
+class SeatHoldsTest(SimpleTestCase):
+    """Удержания мест на LocalHoldStore — замене Redis с той же семантикой"""
+
+    def setUp(self):
+        self.now = 0
+        for patcher in (
+            mock.patch.object(holds, "get_store", return_value=holds.LocalHoldStore()),
+            mock.patch.object(holds, "_now_ms", lambda: self.now),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_seat_held_by_another_user_conflicts(self):
+        holds.acquire(1, {(1, 1), (1, 2)}, user_id=1)
+
+        with self.assertRaises(holds.SeatsHeldError) as conflict:
+            holds.acquire(1, {(1, 2), (1, 3)}, user_id=2)
+
+        self.assertEqual(conflict.exception.seats, ["1-2"])
+        self.assertEqual(holds.held_seats(1, exclude_user_id=2), {(1, 1), (1, 2)})
+        # Свои места пользователь может выбрать снова, другой сеанс не затронут
+        holds.acquire(1, {(1, 2)}, user_id=1)
+        holds.acquire(2, {(1, 2)}, user_id=2)
+
+    def test_hold_expires(self):
+        hold = holds.acquire(1, {(1, 1)}, user_id=1)
+
+        self.now += 60 * 1000
+        self.assertIsNone(holds.get_hold(hold["id"]))
+        self.assertEqual(holds.held_seats(1), set())
+        holds.acquire(1, {(1, 1)}, user_id=2)
+
+    def test_reacquire_replaces_seats(self):
+        hold = holds.acquire(1, {(1, 1), (1, 2)}, user_id=1)
+
+        holds.acquire(1, {(1, 3)}, user_id=1, hold_id=hold["id"])
+
+        self.assertEqual(holds.held_seats(1), {(1, 3)})
+        self.assertEqual(holds.hold_seats(holds.get_hold(hold["id"])), {(1, 3)})
+
+    def test_release_frees_seats(self):
+        hold = holds.acquire(1, {(1, 1)}, user_id=1)
+
+        holds.release(hold["id"])
+
+        self.assertIsNone(holds.get_hold(hold["id"]))
+        self.assertEqual(holds.held_seats(1), set())
+        holds.acquire(1, {(1, 1)}, user_id=2)
+
+
+class ProcessBookingHoldTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.session = create_session()
+        User = get_user_model()
+        cls.owner = User.objects.create_user(email="owner@example.com", first_name="A", last_name="A", password="x")
+        cls.buyer = User.objects.create_user(email="buyer@example.com", first_name="B", last_name="B", password="x")
+
+    def setUp(self):
+        patcher = mock.patch.object(holds, "get_store", return_value=holds.LocalHoldStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_foreign_hold_is_rejected(self):
+        hold = holds.acquire(self.session.pk, {(1, 1)}, user_id=self.owner.pk)
+        self.client.force_login(self.buyer)
+
+        response = self.client.post(
+            reverse("cinema:process_booking", args=[self.session.pk]),
+            {"seats": [{"row": 1, "seat": 1}], "action": "buy", "hold_id": hold["id"]},
+            content_type="application/json",
+        )
+
+        self.assertEqual((response.status_code, response.json()["error"]), (400, "Удержание мест не найдено"))
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(holds.get_hold(hold["id"])["user_id"], self.owner.pk)
+
+
+class IdempotentBookingTest(TestCase):
+    """Повтор запроса бронирования с тем же Idempotency-Key"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.session = create_session()
+        cls.user = get_user_model().objects.create_user(
+            email="buyer@example.com", first_name="Test", last_name="Buyer", password="password"
+        )
+
+    def setUp(self):
+        for module, store in ((holds, holds.LocalHoldStore()), (idempotency, idempotency.LocalResultStore())):
+            patcher = mock.patch.object(module, "get_store", return_value=store)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+
+    def post(self, key="key-1"):
+        return self.client.post(
+            reverse("cinema:process_booking", args=[self.session.pk]),
+            {"seats": [{"row": 1, "seat": 1}], "action": "buy"},
+            content_type="application/json",
+            headers={"Idempotency-Key": key},
+        )
+
+    def test_replay_returns_stored_response(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.post()
+
+        replay = self.post()
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual((replay.status_code, replay.json()), (200, first.json()))
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_response_is_stored_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.post()
+
+        # До коммита ключ занят: повтор получает 409, а не сохранённый ответ
+        self.assertEqual(self.post().status_code, 409)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.post()["Idempotent-Replayed"], "true")
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_server_error_is_not_stored(self):
+        with mock.patch("apps.cinema.views.create_booking", side_effect=RuntimeError("boom")):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.post().status_code, 500)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            retry = self.post()
+
+        self.assertEqual(retry.status_code, 200)
+        self.assertFalse(retry.has_header("Idempotent-Replayed"))
+        self.assertEqual(Booking.objects.count(), 1)
+
+
+class HallTimelineTest(SimpleTestCase):
+    """Занятое время зала: интервалы [начало, конец)"""
+
+    def at(self, hour, minute=0):
+        return datetime(2025, 1, 1, hour, minute, tzinfo=UTC)
+
+    def test_overlapping_slot_is_rejected(self):
+        timeline = HallTimeline([(self.at(12), self.at(14))])
+
+        self.assertFalse(timeline.is_free(self.at(13), self.at(15)))
+        self.assertFalse(timeline.is_free(self.at(11), self.at(12, 1)))
+        self.assertFalse(timeline.is_free(self.at(11), self.at(15)))
+        # Сеанс может начаться в момент окончания предыдущего
+        self.assertTrue(timeline.is_free(self.at(14), self.at(16)))
+        self.assertTrue(timeline.is_free(self.at(10), self.at(12)))
+
+    def test_added_slot_is_busy(self):
+        timeline = HallTimeline()
+        timeline.add(self.at(18), self.at(20))
+
+        self.assertFalse(timeline.is_free(self.at(19), self.at(21)))
+        self.assertEqual(timeline.busy_until(self.at(19), self.at(21)), self.at(20))
+        self.assertEqual(timeline.next_start(self.at(10)), self.at(18))
+
+    def test_overlapping_existing_sessions_are_merged(self):
+        timeline = HallTimeline([(self.at(12), self.at(14)), (self.at(13), self.at(16))])
+
+        self.assertFalse(timeline.is_free(self.at(15), self.at(17)))
+        self.assertEqual(timeline.busy_until(self.at(15), self.at(17)), self.at(16))
+
+
+class PlanSessionsTest(TestCase):
+    def test_planned_sessions_skip_busy_time(self):
+        session = create_session()
+        day = timezone.localdate() + timedelta(days=1)
+        # Зал занят с 11:00 до 19:00: свободны только слоты 20:00 и 22:30
+        start = day_start(day) + timedelta(hours=11)
+        Session.objects.create(
+            movie=session.movie, hall=session.hall, start_time=start, end_time=start + timedelta(hours=8), price=100
+        )
+
+        planned = plan_sessions([day], [session.hall], [session.movie], rng=Random(1))
+
+        self.assertTrue(planned)
+        for new in planned:
+            self.assertTrue(new.end_time <= start or new.start_time >= start + timedelta(hours=8), new.start_time)
+
+
+class PlanScheduleTest(TestCase):
+    """План не выходит за даты проката и форматы фильмов, не пересекается и держит перерыв на уборку"""
+
+    GAP = timedelta(minutes=20)
+
+    @classmethod
+    def setUpTestData(cls):
+        cinema = Cinema.objects.create(name="Test cinema", description="-", conditions="-")
+        cls.halls = [
+            Hall.objects.create(
+                cinema=cinema,
+                name=f"Hall {rows}",
+                description="-",
+                scheme_data={"rows": rows, "columns": 10, "screen_position": "top", "scheme": [[1] * 10] * rows},
+            )
+            for rows in (4, 8)
+        ]
+
+        cls.days = [timezone.localdate() + timedelta(days=i) for i in (1, 2)]
+        cls.movies = [
+            Movie.objects.create(
+                name=name,
+                description="-",
+                trailer_url="https://example.com",
+                start_date=start,
+                end_date=end,
+                formats=formats,
+            )
+            for name, start, end, formats in (
+                ("All days", cls.days[0], cls.days[1], [MovieFormat.IMAX]),
+                ("First day", cls.days[0] - timedelta(days=7), cls.days[0], [MovieFormat.TWO_D, MovieFormat.THREE_D]),
+                ("Second day", cls.days[1], cls.days[1] + timedelta(days=7), []),
+            )
+        ]
+
+        # Уже стоящий сеанс и история продаж: фильмы разной длины и спроса
+        start = day_start(cls.days[0]) + timedelta(hours=14)
+        Session.objects.create(
+            movie=cls.movies[0], hall=cls.halls[0], start_time=start, end_time=start + timedelta(hours=2), price=100
+        )
+        for days_ago, movie, duration, booked in ((3, cls.movies[1], 150, 70), (2, cls.movies[2], 95, 10)):
+            start = day_start(timezone.localdate() - timedelta(days=days_ago)) + timedelta(hours=12)
+            session = Session.objects.create(
+                movie=movie,
+                hall=cls.halls[1],
+                start_time=start,
+                end_time=start + timedelta(minutes=duration),
+                price=100,
+            )
+            Session.objects.filter(pk=session.pk).update(booked_count=booked)
+
+    def test_plan(self):
+        halls = list(Hall.objects.select_related("cinema"))
+        sessions, expected = plan_schedule(self.days, halls, self.movies, gap=self.GAP.seconds // 60)
+
+        self.assertTrue(sessions)
+        self.assertGreater(expected, 0)
+        for session in sessions:
+            day = timezone.localdate(session.start_time)
+            self.assertIn(day, self.days)
+            self.assertTrue(session.movie.start_date <= day <= session.movie.end_date, session.movie.name)
+            self.assertIn(session.format, session.movie.formats or [MovieFormat.TWO_D])
+            self.assertEqual(session.capacity, session.hall.layout["capacity"])
+
+        for hall in halls:
+            intervals = sorted(
+                [(s.start_time, s.end_time) for s in sessions if s.hall_id == hall.pk]
+                + [(s.start_time, s.end_time) for s in Session.objects.filter(hall=hall)]
+            )
+            for (_, end), (next_start, _) in zip(intervals, intervals[1:], strict=False):
+                self.assertGreaterEqual(next_start - end, self.GAP)
+
+
+class SessionIndexesTest(TestCase):
+    """Выборки сеансов по окну дней идут по индексам Session, а не по обёртке колонки в функцию"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.session = create_session()
+
+    def assertUsesIndex(self, queryset, index):
+        # В тестовой базе мало строк — запрещаем последовательное чтение, чтобы увидеть выбор индекса
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        # Окно дней должно попасть в условие индекса, а не в фильтр уже прочитанных строк
+        index_conditions = [line for line in plan.splitlines() if "Index Cond" in line]
+        self.assertTrue(any("start_time" in line for line in index_conditions), plan)
+        self.assertNotIn("Filter", plan)
+
+    def test_hall_day(self):
+        sessions = Session.objects.filter(in_days("start_time", timezone.localdate()), hall=self.session.hall)
+        self.assertUsesIndex(sessions, "session_hall_start_idx")
+
+    def test_movie_days(self):
+        sessions = Session.objects.filter(in_days("start_time", timezone.localdate(), days=2), movie=self.session.movie)
+        self.assertUsesIndex(sessions, "session_movie_start_idx")
+
+    def test_day(self):
+        self.assertUsesIndex(Session.objects.filter(in_days("start_time", timezone.localdate())), "session_start_idx")
+
+    def test_past_sessions(self):
+        self.assertUsesIndex(Session.objects.filter(start_time__lt=timezone.now()), "session_start_idx")
+
+
+class AdmissionQueueTest(SimpleTestCase):
+    """Посетитель, который перестал обновлять страницу ожидания, выбывает из очереди"""
+
+    def admit(self, visitor):
+        return self.store.admit(1, visitor, rate=6, burst=1, pass_ttl_ms=15 * 60 * 1000, queue_ttl_ms=60 * 1000)
+
+    def setUp(self):
+        self.store = admission.LocalAdmissionStore()
+        self.now = 0
+        patcher = mock.patch.object(admission, "_now_ms", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stale_visitor_does_not_take_a_ticket(self):
+        self.assertTrue(self.admit("first")[0])
+        self.assertEqual(self.admit("gone")[1], 1)
+        self.assertEqual(self.admit("waiting")[1], 2)
+
+        # Токен копится 10 секунд, а "gone" не обновлял страницу дольше срока очереди
+        self.now += 61 * 1000
+        self.assertTrue(self.admit("waiting")[0])
+        self.assertFalse(self.admit("gone")[0])
+
+
+class WaitingRoomTest(TestCase):
+    """Проверка очереди берёт пропускную способность сеанса из кэша, а не из БД"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.session = create_session()
+        Movie.objects.filter(pk=cls.session.movie_id).update(admission_rate=1)
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(admission, "get_store", return_value=admission.LocalAdmissionStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_waiting_room_does_not_query_movie(self):
+        # Первый посетитель забирает единственный токен, второй попадает в очередь
+        self.client.get(reverse("cinema:booking", args=[self.session.pk]))
+        self.client.cookies.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("cinema:booking", args=[self.session.pk]))
+
+        self.assertContains(response, "Test movie", status_code=200)
+        self.assertFalse([query for query in queries if "cinema_movie" in query["sql"]])
+
+    def test_gate_is_cached_until_movie_changes(self):
+        self.assertEqual(admission.session_gate(self.session.pk)["admission_rate"], 1)
+        with self.assertNumQueries(0):
+            admission.session_gate(self.session.pk)
+
+        movie = self.session.movie
+        movie.admission_rate = 0
+        with self.captureOnCommitCallbacks(execute=True):
+            movie.save()
+
+        self.assertEqual(admission.session_gate(self.session.pk)["admission_rate"], 0)
+        with self.assertNumQueries(0):
+            admission.session_gate(self.session.pk)
@@ -1,6 +1,6 @@
 from modeltranslation.translator import TranslationOptions, register
 
-from .models import Cinema, Hall, Movie
+from .models import Cinema, Hall, Movie, ScheduleEntry
 
 
 @register(Movie)
@@ -16,3 +16,8 @@ class CinemaTranslationOptions(TranslationOptions):
 @register(Hall)
 class HallTranslationOptions(TranslationOptions):
     fields = ("name", "description")
+
+
+@register(ScheduleEntry)
+class ScheduleEntryTranslationOptions(TranslationOptions):
+    fields = ("movie_name", "cinema_name", "hall_name")
@@ -58,4 +58,37 @@ urlpatterns = [
         views.process_booking,
         name="process_booking",
     ),
+    path(
+        "api/booking/<int:session_id>/hold/",
+        views.hold_seats,
+        name="hold_seats",
+    ),
+    path("api/sessions/", views.session_list_api, name="session_list_api"),
+    path(
+        "feeds/cinema/<int:pk>.<str:fmt>",
+        views.schedule_feed,
+        {"kind": "cinema"},
+        name="cinema_feed",
+    ),
+    path(
+        "feeds/movie/<int:pk>.<str:fmt>",
+        views.schedule_feed,
+        {"kind": "movie"},
+        name="movie_feed",
+    ),
+    path(
+        "api/sessions/<int:session_id>/seats/",
+        views.session_seats,
+        name="session_seats",
+    ),
+    path(
+        "api/sessions/<int:session_id>/best-seats/",
+        views.best_seats,
+        name="best_seats",
+    ),
+    path(
+        "api/sessions/<int:session_id>/events/",
+        views.seat_events,
+        name="seat_events",
+    ),
 ]
@@ -1,18 +1,32 @@
 from datetime import date, timedelta
+from functools import partial
 from itertools import groupby
 
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import DetailView, ListView
 
 from apps.core.forms import GalleryFormSet, SeoBlockForm
 from apps.core.models import Gallery
 
-from .enums import MovieFormat
+from . import events, facets, holds, schedule, seatmap, snapshots
+from .admission import admission_control
 from .forms import CinemaForm, HallForm, PageMovieForm
-from .models import Booking, Cinema, Hall, Movie, Session
+from .idempotency import idempotent
+from .layout import get_layout
+from .models import Cinema, Hall, Movie, ScheduleEntry, Session
+from .services import (
+    SeatsUnavailableError,
+    create_booking,
+    get_occupied_seat_ids,
+    resolve_seats,
+    sync_hall_seats,
+)
 
 # Create your views here.
 
@@ -24,48 +38,25 @@ class MovieDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        movie = self.get_object()
+        today = timezone.localdate()
 
-        # Get sessions for this movie (today and tomorrow)
-        today = date.today()
-        tomorrow = today + timedelta(days=1)
-
-        sessions = (
-            Session.objects.filter(movie=movie, start_time__date__in=[today, tomorrow])
-            .select_related("hall", "hall__cinema")
-            .order_by("start_time")
-        )
-
-        # Get unique cinemas that have sessions for this movie
-        cinemas = Cinema.objects.filter(
-            halls__session__movie=movie,
-            halls__session__start_time__date__in=[today, tomorrow],
-        ).distinct()
-
-        # Group sessions by date
+        # Upcoming days of the movie's schedule from its cached snapshot, grouped in one pass
+        sessions = snapshots.movie_sessions(self.object.pk)
         sessions_by_date = {}
-        for session_date, group in groupby(sessions, key=lambda s: s.start_time.date()):
-            sessions_by_date[session_date] = list(group)
-
-        # Group sessions by cinema
-        from collections import defaultdict
-
-        sessions_by_cinema = defaultdict(list)
+        sessions_by_cinema = {}
         for session in sessions:
-            sessions_by_cinema[session.hall.cinema.id].append(session)
+            sessions_by_date.setdefault(session.date, []).append(session)
+            cinema = {"id": session.cinema_id, "name": session.cinema_name}
+            sessions_by_cinema.setdefault(session.cinema_id, (cinema, []))[1].append(session)
 
-        # Convert to list of tuples (cinema, sessions_list)
-        cinema_sessions = []
-        for cinema in cinemas:
-            if cinema.id in sessions_by_cinema:
-                cinema_sessions.append((cinema, sessions_by_cinema[cinema.id]))
+        cinema_sessions = sorted(sessions_by_cinema.values(), key=lambda item: item[0]["name"])
 
         context["sessions"] = sessions
-        context["cinemas"] = cinemas
+        context["cinemas"] = [cinema for cinema, _ in cinema_sessions]
         context["sessions_by_date"] = sessions_by_date
         context["cinema_sessions"] = cinema_sessions
         context["today"] = today
-        context["tomorrow"] = tomorrow
+        context["tomorrow"] = today + timedelta(days=1)
 
         return context
 
@@ -79,13 +70,8 @@ class CinemaDetailView(DetailView):
         context = super().get_context_data(**kwargs)
         cinema = self.get_object()
 
-        # Get today's sessions for all halls in this cinema
-        today = date.today()
-        today_sessions = (
-            Session.objects.filter(hall__cinema=cinema, start_time__date=today)
-            .select_related("movie", "hall")
-            .order_by("start_time")
-        )
+        # Today's sessions come from the cinema's schedule snapshot (rebuilt by Celery on changes)
+        today_sessions = snapshots.sessions_on(cinema.pk, timezone.localdate())
 
         context["today_sessions"] = today_sessions
         return context
@@ -100,11 +86,8 @@ class HallDetailView(DetailView):
         context = super().get_context_data(**kwargs)
         hall = self.get_object()
 
-        # Get today's sessions for this hall
-        from datetime import date
-
-        today = date.today()
-        today_sessions = hall.session_set.filter(start_time__date=today).select_related("movie").order_by("start_time")
+        # Today's sessions of this hall from the cinema's schedule snapshot
+        today_sessions = snapshots.sessions_on(hall.cinema_id, timezone.localdate(), hall_id=hall.pk)
 
         context["today_sessions"] = today_sessions
         return context
@@ -431,6 +414,7 @@ def hall_create_view(request, cinema_id):
                 hall.seo_block = seo_block
 
             hall.save()
+            sync_hall_seats(hall)
 
             # Галерея
             has_images = any(
@@ -502,6 +486,11 @@ def hall_update_view(request, pk):
 
             hall.save()
 
+            # Схема изменилась — синхронизируем места, битовые карты сеансов зала больше не актуальны
+            if "scheme_data" in form.changed_data:
+                sync_hall_seats(hall)
+                seatmap.forget_sessions(hall.session_set.values_list("pk", flat=True))
+
             # Галерея
             if hall.gallery:
                 gallery_formset.save()
@@ -551,48 +540,21 @@ def hall_delete_view(request, pk):
 
 
 class SessionListView(ListView):
-    model = Session
+    model = ScheduleEntry
     template_name = "cinema/session.html"
     context_object_name = "sessions"
 
     def get_queryset(self):
-        queryset = Session.objects.select_related("movie", "hall", "hall__cinema").order_by("start_time")
-
-        # Filter by format (multiple selection)
-        format_filters = self.request.GET.getlist("format")
-        if format_filters:
-            queryset = queryset.filter(format__in=format_filters)
-
-        # Filter by cinema
-        cinema_id = self.request.GET.get("cinema")
-        if cinema_id:
-            queryset = queryset.filter(hall__cinema_id=cinema_id)
-
-        # Filter by date
-        date_filter = self.request.GET.get("date")
-        if date_filter:
-            queryset = queryset.filter(start_time__date=date_filter)
-
-        # Filter by movie
-        movie_id = self.request.GET.get("movie")
-        if movie_id:
-            queryset = queryset.filter(movie_id=movie_id)
-
-        # Filter by hall
-        hall_id = self.request.GET.get("hall")
-        if hall_id:
-            queryset = queryset.filter(hall_id=hall_id)
-
-        return queryset
+        # Flattened schedule rows (one composite index per filter combination, no joins),
+        # upcoming only by default and paged by a (start_time, id) cursor
+        sessions, self.next_cursor = schedule.get_page(self.request.GET)
+        return sessions
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Add filter choices
-        context["formats"] = MovieFormat.choices
-        context["cinemas"] = Cinema.objects.all()
-        context["movies"] = Movie.objects.filter(start_date__lte=date.today()).order_by("name")
-        context["halls"] = Hall.objects.select_related("cinema").all()
+        # Filter choices with session counts for the other selected filters (cached)
+        context["facets"] = facets.get_facets(self.request.GET)
 
         # Preserve current filters
         context["current_formats"] = self.request.GET.getlist("format")
@@ -601,14 +563,20 @@ class SessionListView(ListView):
         context["current_movie"] = self.request.GET.get("movie", "")
         context["current_hall"] = self.request.GET.get("hall", "")
 
-        # Group sessions by date
-        sessions = context["sessions"]
+        # Group the page by date
         sessions_by_date = {}
-        for session_date, group in groupby(sessions, key=lambda s: s.start_time.date()):
+        for session_date, group in groupby(context["sessions"], key=lambda s: s.date):
             sessions_by_date[session_date] = list(group)
 
         context["sessions_by_date"] = sessions_by_date
 
+        # Next page link keeps the current filters
+        context["is_first_page"] = not self.request.GET.get("cursor")
+        if self.next_cursor:
+            params = self.request.GET.copy()
+            params["cursor"] = self.next_cursor
+            context["next_page_query"] = params.urlencode()
+
         # Add today and tomorrow for booking validation
         today = date.today()
         context["today"] = today
@@ -617,6 +585,7 @@ class SessionListView(ListView):
         return context
 
 
+@method_decorator(admission_control("pk"), name="dispatch")
 class BookingView(DetailView):
     """View for booking page where users select seats and book/buy tickets."""
 
@@ -624,60 +593,45 @@ class BookingView(DetailView):
     template_name = "cinema/booking.html"
     context_object_name = "session"
 
+    def get_queryset(self):
+        # The page only needs the compiled layout, which is cached per hall version
+        return super().get_queryset().select_related("hall").defer("hall__scheme_data", "hall__layout")
+
     def get_context_data(self, **kwargs):
         import json
 
         from django.utils.safestring import mark_safe
 
         context = super().get_context_data(**kwargs)
-        session = self.get_object()
-
-        # Get hall scheme data and serialize to JSON for JavaScript
-        hall = session.hall
-        if hall.scheme_data:
-            # Serialize to JSON string and mark as safe for template
-            context["hall_scheme"] = mark_safe(json.dumps(hall.scheme_data))
-        else:
-            context["hall_scheme"] = mark_safe("null")
-
-        # Get booked seats from database
-        # Find all bookings for this session that are either paid or not expired
-        from django.db.models import Q
-        from django.utils import timezone
+        session = self.object
 
-        active_bookings = (
-            Booking.objects.filter(session=session)
-            .filter(Q(is_paid=True) | Q(expires_at__gte=timezone.now()))
-            .prefetch_related("seats")
-        )
+        # Compiled hall layout, already serialized to JSON
+        layout = get_layout(session.hall)
+        context["hall_layout"] = mark_safe(layout.json)
+        context["hall_capacity"] = layout.capacity
 
-        # Create list of booked seat IDs in format "row-seat" (e.g. "1-5")
-        booked_seats = []
-        for booking in active_bookings:
-            for seat in booking.seats.all():
-                seat_id = f"{seat.row}-{seat.number}"
-                if seat_id not in booked_seats:
-                    booked_seats.append(seat_id)
+        # Booked seats come from the session availability bitmap (one cache read),
+        # seats other buyers are holding right now are shown as occupied as well
+        occupied_seats = get_occupied_seat_ids(session, self.request.user.pk)
 
         # Serialize booked seats to JSON
-        context["booked_seats"] = mark_safe(json.dumps(booked_seats))
+        context["booked_seats"] = mark_safe(json.dumps(occupied_seats))
 
         # Count of already booked seats
-        context["booked_count"] = len(booked_seats)
+        context["booked_count"] = len(occupied_seats)
 
         return context
 
 
 @csrf_exempt
+@admission_control("session_id")
+@idempotent
 def process_booking(request, session_id):
     """Process booking/purchase request via AJAX."""
     import json
 
     from django.db import transaction
     from django.http import JsonResponse
-    from django.utils import timezone
-
-    from .models import Seat
 
     if request.method != "POST":
         return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -699,51 +653,34 @@ def process_booking(request, session_id):
         if not seats_data:
             return JsonResponse({"error": "Не выбраны места"}, status=400)
 
-        with transaction.atomic():
-            # Get or create seats in database
-            seat_objects = []
-            for seat_info in seats_data:
-                row = int(seat_info["row"])
-                number = int(seat_info["seat"])
-
-                # Get or create seat
-                seat, created = Seat.objects.get_or_create(hall=session.hall, row=row, number=number)
-                seat_objects.append(seat)
-
-            # Check if any seats are already booked
-            from django.db.models import Q
-
-            existing_bookings = (
-                Booking.objects.filter(session=session, seats__in=seat_objects)
-                .filter(Q(is_paid=True) | Q(expires_at__gte=timezone.now()))
-                .exists()
-            )
+        positions = {(int(seat_info["row"]), int(seat_info["seat"])) for seat_info in seats_data}
 
-            if existing_bookings:
-                return JsonResponse(
-                    {"error": "Некоторые из выбранных мест уже забронированы"},
-                    status=400,
-                )
-
-            # Create booking
-            booking_fee = 3  # грн за место
-            ticket_count = len(seat_objects)
-            total_tickets = session.price * ticket_count
-            total_amount = total_tickets + (booking_fee * ticket_count)
-
-            # Create booking instance (must save before adding many-to-many)
-            booking = Booking(
-                user=request.user,
-                session=session,
-                ticket_price=session.price,
-                total_amount=total_amount,
-                is_paid=(action == "buy"),  # Если "купить" - сразу оплачено
-                expires_at=timezone.now() + timedelta(minutes=30) if action == "book" else None,
-            )
-            booking.save()  # Save first to get ID
+        # Hold seats in Redis first: conflicting buyers are rejected without touching Postgres
+        hold = holds.get_hold(data.get("hold_id"))
+        if hold:
+            if hold["user_id"] != request.user.pk or hold["session_id"] != session.pk:
+                return JsonResponse({"error": "Удержание мест не найдено"}, status=400)
+            if holds.hold_seats(hold) != positions:
+                hold = holds.acquire(session.pk, positions, request.user.pk, hold["id"])
+        else:
+            hold = holds.acquire(session.pk, positions, request.user.pk)
 
-            # Now we can add seats (many-to-many relationship)
-            booking.seats.set(seat_objects)
+        with transaction.atomic():
+            # Seats are materialized from the hall scheme on save, so one query resolves them all
+            seat_objects = resolve_seats(session.hall, positions)
+            if seat_objects is None:
+                holds.release(hold["id"])
+                return JsonResponse({"error": "Выбранных мест нет в схеме зала"}, status=400)
+
+            # Create the booking with its seats; conflicting buyers fail here and roll back
+            try:
+                booking = create_booking(request.user, session, seat_objects, is_paid=(action == "buy"))
+            except SeatsUnavailableError:
+                holds.release(hold["id"])
+                raise
+
+            # The booking is in the database now, the hold is no longer needed
+            transaction.on_commit(partial(holds.release, hold["id"]))
 
             return JsonResponse(
                 {
@@ -753,7 +690,257 @@ def process_booking(request, session_id):
                 }
             )
 
+    except SeatsUnavailableError:
+        return JsonResponse(
+            {"error": "Некоторые из выбранных мест уже забронированы"},
+            status=400,
+        )
+    except holds.SeatsHeldError as e:
+        return JsonResponse(
+            {"error": "Некоторые из выбранных мест уже забронированы", "seats": e.seats},
+            status=400,
+        )
     except json.JSONDecodeError:
         return JsonResponse({"error": "Неверный формат данных"}, status=400)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
+
+
+@csrf_exempt
+@admission_control("session_id")
+def hold_seats(request, session_id):
+    """Hold selected seats for a few minutes while the buyer decides (no database writes)."""
+    import json
+
+    from django.conf import settings
+    from django.http import JsonResponse
+
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Требуется авторизация"}, status=401)
+
+    try:
+        session = Session.objects.select_related("hall").get(pk=session_id)
+    except Session.DoesNotExist:
+        return JsonResponse({"error": "Сеанс не найден"}, status=404)
+
+    try:
+        data = json.loads(request.body)
+        positions = {(int(seat_info["row"]), int(seat_info["seat"])) for seat_info in data.get("seats", [])}
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return JsonResponse({"error": "Неверный формат данных"}, status=400)
+
+    # Only the owner may extend or release an existing hold
+    hold = holds.get_hold(data.get("hold_id"))
+    if hold and (hold["user_id"] != request.user.pk or hold["session_id"] != session.pk):
+        hold = None
+
+    previous = holds.hold_seats(hold) if hold else set()
+
+    # Empty selection releases the hold
+    if not positions:
+        if hold:
+            holds.release(hold["id"])
+            events.publish(session.pk, previous, False)
+        return JsonResponse({"success": True, "hold_id": None})
+
+    if not positions <= get_layout(session.hall).index.keys():
+        return JsonResponse({"error": "Выбранных мест нет в схеме зала"}, status=400)
+
+    booked = positions & set(seatmap.get_booked_seats(session))
+    if booked:
+        return JsonResponse(
+            {
+                "error": "Некоторые из выбранных мест уже забронированы",
+                "seats": sorted(f"{row}-{number}" for row, number in booked),
+            },
+            status=409,
+        )
+
+    try:
+        hold = holds.acquire(session.pk, positions, request.user.pk, hold["id"] if hold else None)
+    except holds.SeatsHeldError as e:
+        return JsonResponse(
+            {"error": "Некоторые из выбранных мест уже выбраны другим покупателем", "seats": e.seats}, status=409
+        )
+
+    # Let other buyers watching the session see the selection change
+    if positions - previous:
+        events.publish(session.pk, positions - previous, True, request.user.pk)
+    if previous - positions:
+        events.publish(session.pk, previous - positions, False)
+
+    return JsonResponse({"success": True, "hold_id": hold["id"], "expires_in": settings.SEAT_HOLD_TTL})
+
+
+def session_list_api(request):
+    """
+    JSON variant of the public schedule for infinite scroll: the same filters and cursor
+    as SessionListView, plus the cursor of the next page.
+    """
+    from django.http import JsonResponse
+
+    sessions, next_cursor = schedule.get_page(request.GET)
+    return JsonResponse({"results": [schedule.entry_json(entry) for entry in sessions], "next_cursor": next_cursor})
+
+
+def schedule_feed(request, kind, pk, fmt):
+    """
+    Upcoming sessions of a cinema or a movie as an iCalendar or JSON Lines feed.
+
+    Rows are streamed from a server-side cursor. ETag and Last-Modified come from the
+    number of rows and their latest change, so unchanged feeds are answered with 304
+    after a single aggregate query.
+    """
+    from django.conf import settings
+    from django.http import Http404, HttpResponseNotAllowed, StreamingHttpResponse
+    from django.utils.cache import get_conditional_response, patch_cache_control
+    from django.utils.http import http_date
+
+    from . import feeds
+
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+    if fmt not in feeds.CONTENT_TYPES:
+        raise Http404
+
+    owner = get_object_or_404(Movie if kind == "movie" else Cinema, pk=pk)
+    entries = feeds.feed_entries(kind, owner.pk)
+    etag, last_modified = feeds.feed_state(entries, fmt)
+    last_modified = last_modified and int(last_modified.timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        base_url = f"{request.scheme}://{request.get_host()}"
+        if fmt == "ics":
+            chunks = feeds.ical_feed(entries, owner.name, base_url, request.get_host())
+        else:
+            chunks = feeds.jsonl_feed(entries, base_url)
+        response = StreamingHttpResponse(feeds.stream(chunks), content_type=feeds.CONTENT_TYPES[fmt])
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=settings.SCHEDULE_FEED_MAX_AGE)
+    return response
+
+
+def session_seats(request, session_id):
+    """
+    Booked seats of a session with the seat-map version as an ETag.
+
+    Clients poll with If-None-Match and get 304 until the seat map changes. The response
+    costs one primary-key query and one cache read, without rendering the booking page.
+    """
+    from django.http import JsonResponse
+    from django.utils.cache import get_conditional_response
+
+    if request.method not in ("GET", "HEAD"):
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    session = Session.objects.select_related("hall").only("hall__layout_version").filter(pk=session_id).first()
+    if session is None:
+        return JsonResponse({"error": "Сеанс не найден"}, status=404)
+
+    booked_seats, version = seatmap.get_versioned_booked_seats(session)
+    etag = f'"{version}"' if version else None
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(
+            {
+                "session_id": session.pk,
+                "version": version,
+                "booked_seats": [f"{row}-{number}" for row, number in booked_seats],
+            }
+        )
+    if etag:
+        response["ETag"] = etag
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+def best_seats(request, session_id):
+    """Suggest the best block of adjacent free seats for a party of ?count= people."""
+    from django.http import JsonResponse
+
+    from .seatfinder import MAX_PARTY_SIZE, find_best_seats
+
+    if request.method != "GET":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    try:
+        count = int(request.GET.get("count", 1))
+    except ValueError:
+        count = 0
+    if not 1 <= count <= MAX_PARTY_SIZE:
+        return JsonResponse({"error": f"Количество мест должно быть от 1 до {MAX_PARTY_SIZE}"}, status=400)
+
+    session = Session.objects.select_related("hall").only("hall__layout_version").filter(pk=session_id).first()
+    if session is None:
+        return JsonResponse({"error": "Сеанс не найден"}, status=404)
+
+    # Seats held by other buyers are taken as well, the buyer's own hold is free to reuse
+    occupied = set(seatmap.get_booked_seats(session)) | holds.held_seats(session.pk, exclude_user_id=request.user.pk)
+    seats = find_best_seats(get_layout(session.hall), occupied, count)
+    if seats is None:
+        return JsonResponse({"error": "Нет столько свободных мест рядом"}, status=404)
+
+    return JsonResponse({"seats": [{"row": row, "seat": number} for row, number in seats]})
+
+
+@transaction.non_atomic_requests
+async def seat_events(request, session_id):
+    """
+    Stream seat changes of a session as server-sent events.
+
+    Under ASGI the connection stays open: the client gets a snapshot of occupied seats
+    and then every change published by other buyers. A WSGI worker cannot be held for
+    minutes, so there the response is the snapshot only and EventSource reconnects
+    after the retry interval, which degrades to polling.
+    """
+    import asyncio
+    import json
+    from contextlib import aclosing
+
+    from asgiref.sync import sync_to_async
+    from django.conf import settings
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import HttpResponse, StreamingHttpResponse
+
+    session = await Session.objects.select_related("hall").filter(pk=session_id).afirst()
+    if session is None:
+        return HttpResponse(status=404)
+
+    user = await request.auser()
+    user_id = user.pk if user.is_authenticated else None
+
+    async def snapshot():
+        occupied_seats = await sync_to_async(get_occupied_seat_ids)(session, user_id)
+        return f"retry: {settings.SEAT_EVENTS_RETRY * 1000}\nevent: snapshot\ndata: {json.dumps(occupied_seats)}\n\n"
+
+    async def stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.SEAT_EVENTS_STREAM_TIMEOUT
+        async with aclosing(events.listen(session.pk, settings.SEAT_EVENTS_HEARTBEAT)) as messages:
+            subscribed = False
+            async for message in messages:
+                if message:
+                    yield f"event: seats\ndata: {message}\n\n"
+                elif not subscribed:
+                    # Subscribe before reading the snapshot so no change falls in between
+                    subscribed = True
+                    yield await snapshot()
+                else:
+                    yield ": ping\n\n"
+                if loop.time() >= deadline:
+                    break
+
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    else:
+        response = HttpResponse(await snapshot(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
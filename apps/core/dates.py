@@ -0,0 +1,28 @@
+"""
+Фильтрация по календарным дням без обёртки колонки в функцию.
+
+Условие field__date=day превращается в CAST/date(field) = day, и индекс по field не
+используется. Здесь день переводится в полуинтервал [начало дня, начало следующего дня)
+в текущем часовом поясе, который сравнивается с самой колонкой и идёт по индексу.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+def day_start(day):
+    """Начало календарного дня в текущем часовом поясе (aware datetime)"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def day_range(first_day, days=1):
+    """Полуинтервал [начало first_day, начало first_day + days)"""
+    return day_start(first_day), day_start(first_day + timedelta(days=days))
+
+
+def in_days(field, first_day, days=1):
+    """Q: значение field попадает в days календарных дней начиная с first_day"""
+    start, end = day_range(first_day, days)
+    return Q(**{f"{field}__gte": start, f"{field}__lt": end})
@@ -1,14 +1,13 @@
 import os
-import random
-from datetime import datetime, timedelta
-from decimal import Decimal
+from datetime import timedelta
 
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
-from apps.cinema.enums import MovieFormat
 from apps.cinema.models import Hall, Movie, Session
+from apps.cinema.scheduling import create_sessions, plan_sessions
+from apps.core.dates import day_start
 from apps.page.models import PageContacts, PageElse, PageMain
 
 
@@ -90,14 +89,14 @@ class Command(BaseCommand):
 
     def _generate_sessions(self, days_ahead=3):
         """Генерирует расписание сеансов на сегодня и следующие дни"""
-        today = timezone.now().date()
+        today = timezone.localdate()
         dates = [today + timedelta(days=i) for i in range(days_ahead + 1)]
         date_range_str = f"{today.strftime('%d.%m.%Y')} - {dates[-1].strftime('%d.%m.%Y')}"
 
         # Удаляем старые сеансы
-        old_sessions_count = Session.objects.filter(start_time__date__lt=today).count()
+        old_sessions_count = Session.objects.filter(start_time__lt=day_start(today)).count()
         if old_sessions_count > 0:
-            Session.objects.filter(start_time__date__lt=today).delete()
+            Session.objects.filter(start_time__lt=day_start(today)).delete()
             self.stdout.write(self.style.WARNING(f"Удалено {old_sessions_count} устаревших сеансов"))
 
         movies_in_theaters = Movie.objects.filter(start_date__lte=today)
@@ -105,50 +104,11 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING("Нет фильмов в прокате."))
             return
 
-        halls = Hall.objects.select_related("cinema").all()
-        if not halls.exists():
+        halls = list(Hall.objects.select_related("cinema").defer("scheme_data"))
+        if not halls:
             self.stdout.write(self.style.WARNING("Нет залов в базе данных."))
             return
 
-        formats = [MovieFormat.TWO_D, MovieFormat.THREE_D, MovieFormat.IMAX]
-        time_slots = [(10, 0), (12, 30), (15, 0), (17, 30), (20, 0), (22, 30)]
-
-        created_count = 0
-
-        for date in dates:
-            self.stdout.write(f"\n✓ Генерация сеансов на {date.strftime('%d.%m.%Y')}:")
-            for hall in halls:
-                movie = random.choice(movies_in_theaters)
-                num_sessions = random.randint(3, 4)
-                selected_slots = random.sample(time_slots, num_sessions)
-
-                for hour, minute in selected_slots:
-                    # Без replace(), создаем datetime напрямую
-                    naive_start = datetime(date.year, date.month, date.day, hour, minute)
-                    start_time = timezone.make_aware(naive_start)
-
-                    # Длительность фильма: 1ч30м - 3ч
-                    duration_minutes = random.randint(90, 180)
-                    end_time = start_time + timedelta(minutes=duration_minutes)
-
-                    price = Decimal(random.randint(80, 120))
-                    format_choice = random.choice(formats)
-
-                    if not Session.objects.filter(hall=hall, start_time=start_time).exists():
-                        Session.objects.create(
-                            movie=movie,
-                            hall=hall,
-                            start_time=start_time,
-                            end_time=end_time,
-                            price=price,
-                            format=format_choice,
-                        )
-                        created_count += 1
-
-                        self.stdout.write(
-                            f"  Создан сеанс: {movie.name} в {hall.cinema.name} - {hall.name}, "
-                            f"{start_time.strftime('%H:%M')} - {end_time.strftime('%H:%M')}, "
-                            f"{format_choice}, {price} грн"
-                        )
+        created_count = len(create_sessions(plan_sessions(dates, halls, list(movies_in_theaters))))
 
         self.stdout.write(self.style.SUCCESS(f"\n✓ Успешно создано {created_count} сеансов на период {date_range_str}"))
@@ -0,0 +1,79 @@
+"""
+Keyset-пагинация (по курсору) для длинных лент.
+
+Вместо OFFSET следующая страница выбирается условием "строго после последней строки
+предыдущей страницы" по полям сортировки, поэтому любая страница стоит как первая,
+если под сортировку есть индекс. Последнее поле сортировки должно быть уникальным (id).
+Курсор — строковые значения полей сортировки последней строки (полная точность, без
+округления времени) в JSON, закодированные в base64.
+"""
+
+import base64
+import json
+
+from django.db.models import Q
+
+
+def _fields(ordering):
+    return [(name.lstrip("-"), name.startswith("-")) for name in ordering]
+
+
+def encode_cursor(values):
+    payload = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, model, ordering):
+    """Значения курсора, приведённые к типам полей модели; ValueError для испорченного курсора"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    fields = _fields(ordering)
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise ValueError("Invalid cursor")
+    try:
+        return [model._meta.get_field(name).to_python(value) for (name, _), value in zip(fields, values, strict=True)]
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def after_cursor(ordering, values):
+    """
+    Условие "строка идёт после курсора" для сортировки ordering.
+
+    Первое поле дополнительно ограничено нестрогим сравнением, чтобы индекс по нему
+    использовался как диапазон, а не только как фильтр.
+    """
+    fields = _fields(ordering)
+    condition = Q()
+    for i, (name, descending) in enumerate(fields):
+        step = Q(**{name: value for (name, _), value in zip(fields[:i], values[:i], strict=True)})
+        step &= Q(**{f"{name}__{'lt' if descending else 'gt'}": values[i]})
+        condition |= step
+
+    first_name, first_descending = fields[0]
+    return Q(**{f"{first_name}__{'lte' if first_descending else 'gte'}": values[0]}) & condition
+
+
+def keyset_page(queryset, ordering, cursor=None, per_page=20):
+    """
+    Страница queryset после курсора: (объекты, курсор следующей страницы или None).
+
+    Испорченный курсор даёт первую страницу.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        try:
+            queryset = queryset.filter(after_cursor(ordering, decode_cursor(cursor, queryset.model, ordering)))
+        except ValueError:
+            pass
+
+    items = list(queryset[: per_page + 1])
+    if len(items) <= per_page:
+        return items, None
+
+    items = items[:per_page]
+    meta = queryset.model._meta
+    return items, encode_cursor([meta.get_field(name).value_to_string(items[-1]) for name, _ in _fields(ordering)])
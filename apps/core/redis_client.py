@@ -0,0 +1,14 @@
+"""Общий клиент Redis для кэшей бронирования"""
+
+from functools import cache
+
+import redis
+from django.conf import settings
+
+
+@cache
+def get_redis():
+    """Клиент Redis из REDIS_URL или None, если Redis не настроен (тесты, локальная разработка)"""
+    if not settings.REDIS_URL:
+        return None
+    return redis.Redis.from_url(settings.REDIS_URL)
@@ -1 +1,29 @@
-# Create your tests here.
+from datetime import UTC, date, time, timedelta
+
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from .dates import day_range, day_start, in_days
+
+
+@override_settings(TIME_ZONE="Europe/Kyiv")
+class DayWindowTest(SimpleTestCase):
+    def test_day_start_is_local_midnight(self):
+        start = day_start(date(2025, 3, 30))
+        self.assertTrue(timezone.is_aware(start))
+        self.assertEqual(timezone.localtime(start).time(), time.min)
+
+    def test_range_is_half_open_and_spans_days(self):
+        start, end = day_range(date(2025, 1, 10), days=2)
+        self.assertEqual(end - start, timedelta(days=2))
+        self.assertEqual(timezone.localtime(end).date(), date(2025, 1, 12))
+
+    def test_range_follows_dst(self):
+        # 30.03.2025 в Киеве переход на летнее время: в сутках 23 часа
+        start, end = day_range(date(2025, 3, 30))
+        self.assertEqual(end.astimezone(UTC) - start.astimezone(UTC), timedelta(hours=23))
+
+    def test_in_days_compares_the_column_itself(self):
+        start, end = day_range(date(2025, 1, 10))
+        condition = in_days("start_time", date(2025, 1, 10))
+        self.assertEqual(dict(condition.children), {"start_time__gte": start, "start_time__lt": end})
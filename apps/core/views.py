@@ -1,5 +1,5 @@
 import logging
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
@@ -11,6 +11,7 @@ from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 
 from apps.cinema.models import Movie, Session
+from apps.core.dates import in_days
 from apps.core.forms import MailingFileUploadForm
 from apps.core.models import Mailing, MailingFile, MailingRecipient
 from apps.core.tasks import send_mailing_task
@@ -31,11 +32,7 @@ def admin_dashboard(request):
 
     for i in range(7):
         date = today + timedelta(days=i)
-        # Используем datetime напрямую
-        date_start = timezone.make_aware(datetime.combine(date, datetime.min.time()))
-        date_end = timezone.make_aware(datetime.combine(date, datetime.max.time()))
-
-        count = Session.objects.filter(start_time__gte=date_start, start_time__lte=date_end).count()
+        count = Session.objects.filter(in_days("start_time", date)).count()
         sessions_data.append({"date": date.strftime("%d.%m"), "count": count})
 
     # 3. Статистика по полу
@@ -51,11 +48,9 @@ def admin_dashboard(request):
         male_percent = female_percent = 0
 
     today = timezone.now().date()
-    date_start = timezone.make_aware(datetime.combine(today, datetime.min.time()))
-    date_end = timezone.make_aware(datetime.combine(today, datetime.max.time()))
 
     popular_movie = (
-        Session.objects.filter(start_time__gte=date_start, start_time__lte=date_end)
+        Session.objects.filter(in_days("start_time", today))
         .values("movie__id", "movie__name")
         .annotate(sessions_count=Count("id"))
         .order_by("-sessions_count")
@@ -9,5 +9,6 @@ urlpatterns = [
     path("login/", views.login_view, name="login"),
     path("admin-login/", views.admin_login_view, name="admin_login"),
     path("profile/", views.profile_view, name="profile"),
+    path("profile/bookings/", views.booking_history_view, name="booking_history"),
     path("logout/", views.logout_view, name="logout"),
 ]
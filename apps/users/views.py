@@ -81,3 +81,28 @@ def profile_view(request):
         form.fields["language"].initial = request.user.language
 
     return render(request, "users/profile.html", {"form": form, "user": request.user})
+
+
+BOOKING_HISTORY_PER_PAGE = 20
+
+
+@login_required
+def booking_history_view(request):
+    from apps.cinema.models import Booking
+    from apps.core.pagination import keyset_page
+
+    # Страницы по (created_at, id) через индекс booking_user_history_idx: любая страница стоит как первая
+    bookings, next_cursor = keyset_page(
+        Booking.objects.filter(user=request.user)
+        .select_related("session__movie", "session__hall__cinema")
+        .defer("session__hall__scheme_data", "session__hall__layout")
+        .prefetch_related("seats"),
+        ("-created_at", "-id"),
+        cursor=request.GET.get("cursor"),
+        per_page=BOOKING_HISTORY_PER_PAGE,
+    )
+    return render(
+        request,
+        "users/booking_history.html",
+        {"bookings": bookings, "next_cursor": next_cursor, "is_first_page": not request.GET.get("cursor")},
+    )
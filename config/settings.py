@@ -15,6 +15,7 @@ import sys
 from pathlib import Path
 
 import environ
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -105,9 +106,8 @@ DATABASES = {
     }
 }
 
-# Использовать SQLite для тестов
-if "test" in sys.argv:
-    DATABASES["default"] = {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}
+# Тесты идут на Postgres (тестовая база test_<DB_NAME>): ArrayField, диапазоны и ограничение
+# исключения в схеме есть только у него, и SQLite не проходит миграции
 
 
 # Password validation
@@ -188,9 +188,85 @@ CELERY_RESULT_BACKEND = "redis://redis:6379/0"
 CELERY_TASK_SERIALIZER = "json"
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_RESULT_SERIALIZER = "json"
-CELERY_TIMEZONE = "Europe/Kiev"
+# Расписание beat в часовом поясе приложения: полночь задач совпадает со сменой дня в timezone.localdate()
+CELERY_TIMEZONE = TIME_ZONE
 CELERY_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+CELERY_BEAT_SCHEDULE = {
+    "reap-expired-bookings": {
+        "task": "apps.cinema.tasks.reap_expired_bookings",
+        "schedule": 60.0,
+    },
+    # Снимки расписания начинаются с сегодняшнего дня — пересобираем после полуночи (TIME_ZONE);
+    # снимок покрывает несколько дней, так что страницы верны и до пересборки
+    "rebuild-schedule-snapshots": {
+        "task": "apps.cinema.tasks.rebuild_schedule_snapshots",
+        "schedule": crontab(hour=0, minute=1),
+    },
+}
+
+# Redis для кэшей бронирования; пустое значение включает локальную замену в памяти процесса
+REDIS_URL = env("REDIS_URL", default="redis://redis:6379/1")
+if "test" in sys.argv:
+    REDIS_URL = ""
+    # Без брокера задачи Celery в тестах выполняются сразу при вызове
+    CELERY_TASK_ALWAYS_EAGER = True
+
+# Кэш Django (фасеты и снимки расписания) — в том же Redis, без Redis — в памяти процесса
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "kinocms",
+        }
+    }
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# Максимальное время жизни битовой карты занятых мест сеанса (секунды)
+SEAT_MAP_CACHE_TTL = 60 * 60
+
+# Сколько держать выбранные места за покупателем до подтверждения брони (секунды)
+SEAT_HOLD_TTL = 10 * 60
+
+# Live-обновление схемы зала (SSE): длительность одного соединения, интервал keep-alive
+# и пауза перед переподключением клиента (секунды)
+SEAT_EVENTS_STREAM_TIMEOUT = 5 * 60
+SEAT_EVENTS_HEARTBEAT = 15
+SEAT_EVENTS_RETRY = 3
+
+# Очередь на бронирование популярных сеансов: сколько секунд скорости пропуска можно
+# накопить для всплеска, сколько действует пропуск после последнего запроса и через сколько
+# секунд без обновления страницы ожидания посетитель выбывает из очереди (секунды)
+ADMISSION_BURST_SECONDS = 10
+ADMISSION_PASS_TTL = 15 * 60
+ADMISSION_QUEUE_TTL = 60
+# Сколько кэшировать пропускную способность сеанса; изменения сеанса и фильма сбрасывают кэш сразу
+ADMISSION_GATE_TTL = 60 * 60
+
+# Сколько хранить ответ API бронирования по ключу идемпотентности и сколько держать ключ
+# занятым, пока первый запрос выполняется (секунды)
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_LOCK_TTL = 60
+
+# Сколько хранить в кэше фасеты фильтров расписания для одной комбинации фильтров (секунды);
+# изменения сеансов сбрасывают кэш сразу, срок нужен, чтобы прошедшие сеансы выпадали из счётчиков
+SCHEDULE_FACETS_TTL = 5 * 60
+
+# Снимки расписания кинотеатров: на сколько дней вперёд, сколько хранить (секунды) и сколько
+# не ставить повторную пересборку кинотеатра, пока первая ждёт в очереди (секунды)
+SCHEDULE_SNAPSHOT_DAYS = 7
+SCHEDULE_SNAPSHOT_TTL = 24 * 60 * 60
+SCHEDULE_SNAPSHOT_DEBOUNCE = 60
+# Сеансы на странице фильма: сколько дней начиная с сегодняшнего
+SCHEDULE_MOVIE_DAYS = 2
+
+# Сколько кэши и прокси могут отдавать ленту расписания без проверки ETag (секунды)
+SCHEDULE_FEED_MAX_AGE = 5 * 60
+
+# Сколько истёкших броней удалять за одну транзакцию
+BOOKING_REAPER_BATCH_SIZE = 500
 
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.gmail.com"